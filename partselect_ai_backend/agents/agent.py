@@ -4,11 +4,11 @@ from langgraph.graph import StateGraph, MessagesState
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage
 from langchain_core.tools import Tool
-from langchain_deepseek import ChatDeepSeek
 from dotenv import load_dotenv
 
+from .llm import get_chat_model
 from .tools import (
-    search_partselect_keywords, 
+    search_partselect_keywords, search_repair_guides, check_part_compatibility,
     add_to_cart, view_cart, checkout,
     return_policy, help_links
 )
@@ -25,6 +25,23 @@ tools = [
             "Never respond for microwaves, ovens, or any other category."
         )
     ),
+    Tool(
+        name="SearchRepairGuides",
+        func=search_repair_guides,
+        description=(
+            "Searches local Refrigerator and Dishwasher repair guides for a symptom "
+            "(e.g., 'fridge not cooling', 'dishwasher not draining'). "
+            "Returns ranked troubleshooting steps and candidate part names in milliseconds."
+        )
+    ),
+    Tool(
+        name="CheckPartCompatibility",
+        func=check_part_compatibility,
+        description=(
+            "Checks whether a PS part number fits an appliance model using the PartSelect compatibility catalog. "
+            "Input: the PS number and the model number, e.g. 'PS11752778 WRS325SDHZ'."
+        )
+    ),
     # Tool(
 #         name="PartSelectSearch",
 #         func=lambda q: search.run(f"site:partselect.com {q}"),
@@ -81,11 +98,13 @@ You are a helpful assistant for PartSelect.com, specializing in REFRIGERATOR and
     * When Talking about any product give its information in a card format  **Standard Part Recommendation Format:** When recommending or identifying a specific part, use this format. **You MUST include the link if a relevant URL was found in the search results.**
     - **PS-1234567** (Example Part Name)
       <a href="URL_found_in_search_results" target="_blank">View Part</a>
+    * For "will this part fit my model?" questions with both a PS number and a model number, use `CheckPartCompatibility` first; only search if the model is not in the catalog.
     * **Do NOT Invent:** Do **not** invent PS numbers, **prices**, compatibility details, URLs, or other information not present in the tool's output.
 
 3.  **Troubleshooting:**
     * Ask for the appliance model number if relevant.
-    * Use `SearchPartSelectKeywords` with symptoms and model/brand.
+    * Use `SearchRepairGuides` with the symptom first for troubleshooting steps and candidate parts.
+    * Use `SearchPartSelectKeywords` with symptoms and model/brand, or with candidate part names, to find PS numbers and links.
     * If providing troubleshooting steps based on search results, present them clearly:
         - Give step-by-step strategies — **numbered and clear**.
     * If recommending parts based on troubleshooting search results:
@@ -125,22 +144,21 @@ You are a helpful assistant for PartSelect.com, specializing in REFRIGERATOR and
 """
 
 
-def build_agent_for_session(session_id: str, callback_handler=None):
-    print(f"[build_agent_for_session] Creating agent components for session: {session_id}")
+def build_agent_for_session(session_id: str, callback_handler=None, model=None, memory=None, tier: str = "full"):
+    """Compiles the agent graph for a session.
 
-    memory = MemorySaver()
+    Pass the session's existing `memory` to compile another model tier over the same
+    conversation checkpoints.
+    """
+    print(f"[build_agent_for_session] Creating agent components for session: {session_id} (tier: {tier})")
 
-    base_model = ChatDeepSeek(
-        model="deepseek-chat",
-        temperature=0.1,
-        streaming=True,
-        max_tokens=None,
-        timeout=None,
-        max_retries=2,
-    )
-    global system_instructions
-    system_instructions = system_instructions + f"\n\n**Session ID:** {session_id}\n\n"  
-    agent_runnable = create_react_agent(base_model, tools, prompt=system_instructions)
+    memory = memory or MemorySaver()
+
+    # Shares one pooled HTTP client across sessions (see agents/llm.py); `model` overrides it, e.g. with a local stand-in
+    base_model = model or get_chat_model(tier)
+    # Per-session prompt; the module-level instructions stay unchanged across sessions
+    session_instructions = system_instructions + f"\n\n**Session ID:** {session_id}\n\n"
+    agent_runnable = create_react_agent(base_model, tools, prompt=session_instructions)
 
     workflow = StateGraph(MessagesState)
     workflow.add_node("agent", agent_runnable)
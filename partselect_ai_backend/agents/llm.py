@@ -0,0 +1,252 @@
+import asyncio
+import importlib.util
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, List, Optional
+
+import httpx
+
+from metrics import metrics
+
+if TYPE_CHECKING:
+    from langchain_deepseek import ChatDeepSeek
+
+# "local" swaps the remote model for the offline LocalChatModel stand-in (benchmarks, batch dry runs)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "deepseek").lower()
+
+# Shared, pooled HTTP clients for every LLM call in this process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "True") == "True"
+# Deadlines: read is the maximum gap between streamed chunks, not the whole answer
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "5"))
+# Hedging (opt-in): if no response headers arrive within LLM_HEDGE_AFTER seconds, race a second
+# attempt. Each hedge is another billed generation, so it is off (0) unless set.
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+# Longest Retry-After honoured before a retry; a 429/503 asking for longer is returned as is
+LLM_RETRY_AFTER_MAX = float(os.getenv("LLM_RETRY_AFTER_MAX", "5"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+llm_http_inflight = metrics.gauge("llm_http_inflight_requests", "LLM HTTP requests holding a pooled connection (including open streams).")
+llm_http_pool_max = metrics.gauge("llm_http_pool_max_connections", "Configured LLM HTTP pool size.")
+llm_http_requests = metrics.counter("llm_http_requests_total", "LLM HTTP attempts by outcome.")
+llm_http_hedges = metrics.counter("llm_http_hedged_attempts_total", "Extra LLM attempts launched because the first was slow.")
+llm_http_latency = metrics.histogram("llm_http_time_to_headers_seconds", "Time until the LLM API returned response headers.")
+llm_http_pool_max.set(LLM_MAX_CONNECTIONS)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Keeps the in-flight gauge up until a (streaming) response body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            llm_http_inflight.dec()
+        await self._stream.aclose()
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """The response's Retry-After (delta-seconds or HTTP date) in seconds, or None if absent/invalid."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HedgedAsyncTransport(httpx.AsyncBaseTransport):
+    """Retries connection failures and retryable statuses, and hedges slow attempts.
+
+    Replaces the OpenAI client's blanket retries: a stuck attempt no longer holds the
+    turn hostage, and only errors that are safe to repeat are retried. A retried status
+    waits for its Retry-After; one asking for more than `retry_after_max` is not retried.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, hedge_after: float = LLM_HEDGE_AFTER,
+                 max_attempts: int = LLM_MAX_ATTEMPTS, retry_after_max: float = LLM_RETRY_AFTER_MAX):
+        self._transport = transport
+        self.hedge_after = hedge_after
+        self.max_attempts = max(1, max_attempts)
+        self.retry_after_max = retry_after_max
+
+    async def _attempt(self, request: httpx.Request) -> httpx.Response:
+        llm_http_inflight.inc()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            llm_http_inflight.dec()
+            raise
+        llm_http_latency.observe(loop.time() - started)
+        response.stream = _TrackedStream(response.stream)
+        return response
+
+    async def _discard(self, task: asyncio.Task) -> None:
+        if not task.done():
+            task.cancel()
+            return
+        if not task.cancelled() and task.exception() is None:
+            await task.result().aclose()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()  # buffered body so it can be re-sent
+        launched = 1
+        pending: List[asyncio.Task] = [asyncio.create_task(self._attempt(request))]
+        last_error: Optional[BaseException] = None
+        retry_after = 0.0
+        try:
+            while pending:
+                can_launch = launched < self.max_attempts
+                timeout = self.hedge_after if (can_launch and self.hedge_after > 0) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    llm_http_hedges.inc()
+                    launched += 1
+                    pending.append(asyncio.create_task(self._attempt(request)))
+                    continue
+
+                for task in done:
+                    pending.remove(task)
+                    error = task.exception()
+                    if error is None:
+                        response = task.result()
+                        wait = retry_after_seconds(response) if response.status_code in RETRYABLE_STATUS else None
+                        if (response.status_code in RETRYABLE_STATUS and (pending or launched < self.max_attempts)
+                                and (wait is None or wait <= self.retry_after_max)):
+                            llm_http_requests.inc(labels={"outcome": f"retry_{response.status_code}"})
+                            retry_after = max(retry_after, wait or 0.0)
+                            await response.aclose()
+                            continue
+                        llm_http_requests.inc(labels={"outcome": "ok" if response.status_code < 400 else f"status_{response.status_code}"})
+                        return response
+                    llm_http_requests.inc(labels={"outcome": type(error).__name__})
+                    if not isinstance(error, RETRYABLE_ERRORS):
+                        raise error
+                    last_error = error
+
+                if not pending and launched < self.max_attempts:
+                    # Jittered backoff before replacing a failed attempt, at least what the server asked for
+                    await asyncio.sleep(max(retry_after, random.uniform(0.05, 0.25) * launched))
+                    retry_after = 0.0
+                    launched += 1
+                    pending.append(asyncio.create_task(self._attempt(request)))
+            raise last_error or httpx.TransportError("LLM request failed")
+        finally:
+            # Whatever is still pending lost the race (or we are failing): cancel or close it
+            for task in pending:
+                await self._discard(task)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    if not LLM_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        print("[LLM] HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1 keep-alive.")
+        return False
+    return True
+
+
+def llm_timeout() -> httpx.Timeout:
+    return httpx.Timeout(connect=LLM_CONNECT_TIMEOUT, read=LLM_READ_TIMEOUT, write=LLM_WRITE_TIMEOUT, pool=LLM_POOL_TIMEOUT)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """The process-wide pooled async client used for all streamed LLM calls."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        http2 = _http2_available()
+        transport = httpx.AsyncHTTPTransport(http2=http2, limits=_limits())
+        _async_client = httpx.AsyncClient(transport=HedgedAsyncTransport(transport), timeout=llm_timeout())
+        print(f"[LLM] Shared async HTTP client ready (http2={http2}, max_connections={LLM_MAX_CONNECTIONS}).")
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """Shared sync client; only used if something invokes the model synchronously."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(http2=_http2_available(), limits=_limits(), timeout=llm_timeout())
+    return _sync_client
+
+
+async def close_http_clients() -> None:
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def get_chat_model(tier: str = "full") -> "ChatDeepSeek":
+    """Builds the chat model for a tier on top of the shared connection pool.
+
+    "fast" uses LLM_FAST_MODEL, optionally on another OpenAI-compatible endpoint
+    (LLM_FAST_BASE_URL / LLM_FAST_API_KEY); "full" is deepseek-chat.
+    With LLM_BACKEND=local both tiers use the offline LocalChatModel.
+    """
+    if LLM_BACKEND == "local":
+        from .standins import LocalChatModel
+        return LocalChatModel()
+    from langchain_deepseek import ChatDeepSeek  # heavy import, deferred until a graph is built
+
+    tier_kwargs = {}
+    if tier == "fast" and os.getenv("LLM_FAST_MODEL"):
+        tier_kwargs["model"] = os.getenv("LLM_FAST_MODEL")
+        tier_kwargs["max_tokens"] = int(os.getenv("LLM_FAST_MAX_TOKENS", "512"))
+        if os.getenv("LLM_FAST_BASE_URL"):
+            tier_kwargs["api_base"] = os.getenv("LLM_FAST_BASE_URL")
+        if os.getenv("LLM_FAST_API_KEY"):
+            tier_kwargs["api_key"] = os.getenv("LLM_FAST_API_KEY")
+    return ChatDeepSeek(**{
+        "model": "deepseek-chat",
+        "temperature": 0.1,
+        "streaming": True,
+        "stream_usage": True,  # token usage per tier is recorded from the final chunk
+        "max_tokens": None,
+        "timeout": llm_timeout(),
+        "max_retries": 0,  # HedgedAsyncTransport owns retries
+        "http_client": get_sync_http_client(),
+        "http_async_client": get_async_http_client(),
+        **tier_kwargs,
+    })
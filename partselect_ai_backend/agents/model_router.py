@@ -0,0 +1,64 @@
+import os
+import re
+from typing import NamedTuple
+
+# Tier policy: "fast" turns go to LLM_FAST_MODEL, everything else (and anything uncertain) to the full model.
+# Tiering is on only when a fast model is configured, unless LLM_TIERING says otherwise.
+LLM_TIERING = os.getenv("LLM_TIERING", "on" if os.getenv("LLM_FAST_MODEL") else "off").lower() == "on"
+# Below this router confidence a "fast" decision escalates to the full model
+LLM_TIER_MIN_CONFIDENCE = float(os.getenv("LLM_TIER_MIN_CONFIDENCE", "0.75"))
+# Messages longer than this are never considered lightweight
+LLM_FAST_MAX_WORDS = int(os.getenv("LLM_FAST_MAX_WORDS", "20"))
+
+FULL_TIER = "full"
+FAST_TIER = "fast"
+
+_ACKNOWLEDGEMENT = re.compile(
+    r"^\s*(?:ok(?:ay)?|k|yes|yep|yeah|sure|no|nope|thanks?(?: you)?|thx|great|perfect|cool|got it|sounds good|"
+    r"that'?s all|bye|goodbye|hi|hello|hey)[\s.!?]*$",
+    re.IGNORECASE,
+)
+_CART_OPERATION = re.compile(
+    r"\b(?:add(?:\s+\w+){0,4}\s+to\s+(?:my\s+|the\s+)?cart|view\s+(?:my\s+)?cart|show\s+(?:me\s+)?(?:my\s+)?cart|"
+    r"what'?s\s+in\s+my\s+cart|check\s*out|empty\s+(?:my\s+)?cart|clear\s+(?:my\s+)?cart|return\s+policy|help\s+links?)\b",
+    re.IGNORECASE,
+)
+# Symptoms, diagnosis and compatibility questions need the full model's reasoning
+_COMPLEX = re.compile(
+    r"\b(?:not\s+(?:cooling|working|draining|cleaning|drying|making|dispensing|starting|filling)|won'?t|doesn'?t|isn'?t|"
+    r"broken|leak(?:s|ing)?|noise|noisy|loud|smell|error\s+code|troubleshoot|diagnos\w*|fix|repair|install\w*|"
+    r"replace\w*|compatib\w*|fit|fits|why|how)\b",
+    re.IGNORECASE,
+)
+
+
+class TierDecision(NamedTuple):
+    tier: str
+    confidence: float
+    reason: str
+
+
+def _classify(message: str) -> TierDecision:
+    words = len(message.split())
+    if not words:
+        return TierDecision(FAST_TIER, 0.9, "empty")
+    if words > LLM_FAST_MAX_WORDS:
+        return TierDecision(FULL_TIER, 0.9, "long")
+    if _COMPLEX.search(message):
+        return TierDecision(FULL_TIER, 0.9, "complex")
+    if _ACKNOWLEDGEMENT.match(message):
+        return TierDecision(FAST_TIER, 0.95, "acknowledgement")
+    if _CART_OPERATION.search(message):
+        # A cart op with extra words may hide a real question, so trust it less as it grows
+        return TierDecision(FAST_TIER, 0.9 if words <= 8 else 0.7, "cart")
+    return TierDecision(FULL_TIER, 0.5, "default")
+
+
+def route_turn(message: str) -> TierDecision:
+    """Picks the model tier for a user turn; low-confidence fast decisions escalate to full."""
+    if not LLM_TIERING:
+        return TierDecision(FULL_TIER, 1.0, "tiering_off")
+    decision = _classify(message)
+    if decision.tier == FAST_TIER and decision.confidence < LLM_TIER_MIN_CONFIDENCE:
+        return TierDecision(FULL_TIER, decision.confidence, f"escalated_{decision.reason}")
+    return decision
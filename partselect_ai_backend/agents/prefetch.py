@@ -0,0 +1,156 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+# Start part/model searches as soon as a message arrives, in parallel with the first LLM call
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "True") == "True"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+PREFETCH_MAX_PER_MESSAGE = int(os.getenv("PREFETCH_MAX_PER_MESSAGE", "3"))
+# Finished prefetches stay servable this long, so a later turn about the same part can still hit
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "300"))
+PREFETCH_CACHE_MAX_ENTRIES = int(os.getenv("PREFETCH_CACHE_MAX_ENTRIES", "1000"))
+# How long a tool call waits on a prefetch that is still running before searching itself
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", "10"))
+
+# Shared with the tools (agents/tools.py), so prefetching and tool parsing agree on what an identifier is
+PS_NUMBER = re.compile(r"\bPS-?(\d{5,})\b", re.IGNORECASE)
+# Appliance model numbers: 5+ characters mixing letters and digits, e.g. WRS325SDHZ, WDT780SAEM1
+MODEL_NUMBER = re.compile(r"\b(?=[A-Z0-9-]*\d)(?=[A-Z0-9-]*[A-Z])[A-Z0-9][A-Z0-9-]{4,}\b", re.IGNORECASE)
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+prefetch_started = metrics.counter("prefetch_started_total", "Speculative searches started, by identifier kind.")
+prefetch_hits = metrics.counter("prefetch_hits_total", "Tool searches served from a prefetch.")
+prefetch_misses = metrics.counter("prefetch_misses_total", "Tool searches with no usable prefetch.")
+prefetch_unused = metrics.counter("prefetch_unused_total", "Prefetches no tool call used (outcome=cancelled|cached).")
+
+
+def extract_identifiers(text: str) -> List[Tuple[str, str]]:
+    """(kind, normalized id) for PS numbers first, then model numbers, without duplicates."""
+    found: List[Tuple[str, str]] = []
+    for digits in PS_NUMBER.findall(text):
+        key = ("part", f"PS{digits}")
+        if key not in found:
+            found.append(key)
+    for match in MODEL_NUMBER.findall(text):
+        model = match.replace("-", "").upper()
+        key = ("model", model)
+        if not PS_NUMBER.fullmatch(match) and key not in found:
+            found.append(key)
+    return found
+
+
+class SearchPrefetcher:
+    """Runs `fetch(identifier)` ahead of the agent and serves matching tool searches from the result.
+
+    A prefetch only answers a search for exactly its identifier ("PS11752778", "ps-11752778").
+    A query that adds words ("PS11752778 installation video") asks for something else, so it
+    runs its own search.
+    """
+
+    def __init__(self, fetch: Callable[[str], Optional[str]], workers: int = PREFETCH_WORKERS):
+        self.fetch = fetch
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        # identifier -> (expires_at, future); insertion-ordered for eviction
+        self._entries: "OrderedDict[str, Tuple[float, Future]]" = OrderedDict()
+        # session_id -> identifiers prefetched for its running turn, and which of them were used
+        self._turns: Dict[str, Dict[str, bool]] = {}
+
+    def start(self, session_id: str, message: str) -> List[str]:
+        """Starts searches for the identifiers in `message`; returns the identifiers prefetched."""
+        if not PREFETCH_ENABLED:
+            return []
+        started = []
+        now = time.monotonic()
+        with self._lock:
+            turn = self._turns.setdefault(session_id, {})
+            for kind, identifier in extract_identifiers(message)[:PREFETCH_MAX_PER_MESSAGE]:
+                turn.setdefault(identifier, False)
+                if self._usable(self._entries.get(identifier), now):
+                    continue
+                self._entries[identifier] = (now + PREFETCH_TTL, self._executor.submit(self.fetch, identifier))
+                self._entries.move_to_end(identifier)
+                prefetch_started.inc(labels={"kind": kind})
+                started.append(identifier)
+            while len(self._entries) > PREFETCH_CACHE_MAX_ENTRIES:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                evicted.cancel()
+        if started:
+            print(f"[Prefetch] Session {session_id}: searching {', '.join(started)} ahead of the agent.")
+        return started
+
+    @staticmethod
+    def _usable(entry: Optional[Tuple[float, Future]], now: float) -> bool:
+        """Not expired, and either still running or finished with a result."""
+        if entry is None or entry[0] <= now or entry[1].cancelled():
+            return False
+        future = entry[1]
+        return not future.done() or (future.exception() is None and bool(future.result()))
+
+    @staticmethod
+    def _identifier(query: str) -> Optional[str]:
+        """The normalized PS/model number if the query is nothing but that identifier, else None."""
+        found = extract_identifiers(query)
+        if len(found) != 1:
+            return None
+        identifier = found[0][1]
+        return identifier if _NON_ALNUM.sub("", query.upper()) == identifier else None
+
+    def take(self, query: str) -> Optional[str]:
+        """The prefetched result for a tool query, waiting briefly if it is still running; None on a miss.
+
+        Only queries that are a bare PS/model number count towards the hit rate.
+        """
+        identifier = self._identifier(query)
+        if identifier is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(identifier)
+            if not self._usable(entry, time.monotonic()):
+                prefetch_misses.inc()
+                return None
+            future = entry[1]
+            for turn in self._turns.values():
+                if identifier in turn:
+                    turn[identifier] = True
+        try:
+            result = future.result(timeout=PREFETCH_WAIT)
+        except Exception as e:
+            print(f"[Prefetch] Not serving {identifier}: {type(e).__name__}")
+            prefetch_misses.inc()
+            return None
+        if not result:
+            prefetch_misses.inc()
+            return None
+        prefetch_hits.inc()
+        print(f"[Prefetch] Served '{query}' from the {identifier} prefetch.")
+        return result
+
+    def finish(self, session_id: str) -> None:
+        """Ends a turn: unused prefetches that haven't started are cancelled, the rest stay cached."""
+        with self._lock:
+            turn = self._turns.pop(session_id, {})
+            for identifier, used in turn.items():
+                if used:
+                    continue
+                _, future = self._entries.get(identifier, (0.0, None))
+                if future is not None and future.cancel():
+                    self._entries.pop(identifier, None)
+                    prefetch_unused.inc(labels={"outcome": "cancelled"})
+                else:
+                    prefetch_unused.inc(labels={"outcome": "cached"})
+
+
+def _hit_rate() -> float:
+    hits = prefetch_hits.value()
+    total = hits + prefetch_misses.value()
+    return hits / total if total else 0.0
+
+
+metrics.gauge("prefetch_hit_rate", "Share of bare part/model number tool searches served from a prefetch.", _hit_rate)
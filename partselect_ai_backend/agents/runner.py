@@ -0,0 +1,287 @@
+import asyncio
+import os
+import time
+import traceback
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+from langchain_core.callbacks.base import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import LLMResult
+
+from .agent import build_agent_for_session
+from .model_router import FULL_TIER, route_turn
+from .tools import keyword_prefetcher
+from concurrency import SessionTurnSlot, TurnRejectedError, admission_controller, session_turns
+from metrics import metrics
+from session_activity import session_activity
+from stream_buffer import TurnStream, stream_buffer
+
+# How tokens are pulled out of the graph (see benchmarks/stream_bench.py):
+# "callback" is a callback-to-queue bridge (leanest), "messages" uses stream_mode="messages",
+# "events" the original astream_events(v2)
+CHAT_STREAM_MODE = os.getenv("CHAT_STREAM_MODE", "callback").lower()
+if CHAT_STREAM_MODE not in ("events", "messages", "callback"):
+    print(f"[Runner] Unknown CHAT_STREAM_MODE '{CHAT_STREAM_MODE}', using 'callback'.")
+    CHAT_STREAM_MODE = "callback"
+
+tier_decisions = metrics.counter("llm_tier_decisions_total", "Model tier chosen per turn, by router reason.")
+tier_turns = metrics.counter("llm_tier_turns_total", "Finished turns per model tier and outcome.")
+tier_latency = metrics.histogram("llm_tier_turn_seconds", "Wall time of a turn per model tier.")
+tier_tokens = metrics.counter("llm_tier_tokens_total", "LLM tokens per model tier (kind=input|output).")
+tier_llm_calls = metrics.counter("llm_tier_llm_calls_total", "LLM calls per model tier (a turn can make several).")
+
+# In-memory cache for agent instances (eviction strategy for production)
+session_memory_cache: Dict[str, Dict[str, Any]] = {}
+
+# Strong references to turns running in the background (asyncio only keeps weak ones)
+background_turns: Set[asyncio.Task] = set()
+
+
+class FastAPIStreamingHandler(AsyncCallbackHandler):
+    def __init__(self, prefix: str = "Handler"):
+        # self.queue = queue
+        self.prefix = prefix
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
+        print(f"[{self.prefix} Log] Tool Start: {serialized.get('name')}, Input: {input_str}")
+
+    async def on_tool_end(self, output: str, **kwargs: Any):
+        print(f"[{self.prefix} Log] Tool End: Output: {output[:100]}{'...' if len(output) > 100 else ''}")
+
+
+def get_or_create_session_agent(session_id: str) -> Tuple[Dict[str, Any], bool]:
+    """Returns the cached agent entry for a session, building it on first use. Second value is True if new.
+
+    Makes no Redis calls; callers record a new agent with `record_new_session` off the event loop.
+    """
+    if session_id in session_memory_cache:
+        print(f"Reusing existing agent for session: {session_id}")
+        return session_memory_cache[session_id], False
+
+    print(f"Creating new agent for session: {session_id}")
+    handler = FastAPIStreamingHandler(prefix=f"Agent-{session_id[:4]}")
+    app, memory = build_agent_for_session(
+        session_id,
+        callback_handler=handler
+    )
+    # Store the compiled app and memory in cache; other tiers are compiled over the same memory on demand
+    session_memory_cache[session_id] = {
+        "app": app,
+        "apps": {FULL_TIER: app},
+        "memory": memory,
+        "handler": handler
+    }
+    print(f"Agent and memory cached for session: {session_id}")
+    return session_memory_cache[session_id], True
+
+
+async def record_new_session(session_id: str) -> None:
+    """Writes the session record for a newly built agent right away, in a thread (sync Redis round trip)."""
+    await asyncio.to_thread(session_activity.create, session_id, {"agent_initialized": True})
+
+
+def get_session_app(session_id: str, entry: Dict[str, Any], tier: str):
+    """Returns the session's compiled graph for a model tier, sharing the session's checkpoints."""
+    if tier not in entry["apps"]:
+        entry["apps"][tier], _ = build_agent_for_session(
+            session_id,
+            callback_handler=entry["handler"],
+            memory=entry["memory"],
+            tier=tier,
+        )
+    return entry["apps"][tier]
+
+
+class _UsageHandler(AsyncCallbackHandler):
+    """Sums token usage reported by the model over one turn."""
+    run_inline = True
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_calls = 0
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+
+async def run_turn(session_id: str, message: str, turn: TurnStream, slot: Optional[SessionTurnSlot] = None) -> None:
+    """Runs one agent turn and publishes its SSE events into the turn buffer.
+
+    Runs independently of any HTTP connection, so a client that drops mid-answer
+    can reconnect and resume from the buffer instead of paying for a new LLM run.
+    Turns of the same session wait for each other, so checkpoints never interleave.
+    """
+    try:
+        async with slot or session_turns.reserve(session_id):
+            await _stream_agent_turn(session_id, message, turn)
+    except TurnRejectedError as e:
+        print(f"[Stream] Turn rejected for session {session_id}: {e}")
+        turn.publish({"type": "error", "content": "This conversation is busy, please retry shortly.", "session_id": session_id})
+    finally:
+        stream_buffer.finish_turn(turn)
+
+
+async def iter_tokens_events(app, graph_input: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[str]:
+    """Token stream via astream_events(v2): builds an event dict for every callback of every nested runnable."""
+    async for event in app.astream_events(graph_input, config=config, version="v2"):
+        if event["event"] == "on_chat_model_stream":
+            chunk_data = event.get("data", {}).get("chunk")
+            if chunk_data and hasattr(chunk_data, 'content'):
+                token = chunk_data.content
+                if isinstance(token, str):
+                    yield token
+
+
+async def iter_tokens_messages(app, graph_input: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[str]:
+    """Token stream via stream_mode="messages": only LLM message chunks are emitted.
+
+    subgraphs=True is needed because the ReAct agent runs as a subgraph inside the
+    outer graph's "agent" node; tool messages are skipped.
+    """
+    async for _namespace, (chunk, _metadata) in app.astream(graph_input, config=config, stream_mode="messages", subgraphs=True):
+        if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) and chunk.content:
+            yield chunk.content
+
+
+class _TokenQueueHandler(AsyncCallbackHandler):
+    """Forwards LLM tokens from callbacks straight into a queue, without building stream events."""
+    run_inline = True
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.queue.put_nowait(token)
+
+
+async def iter_tokens_callback(app, graph_input: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[str]:
+    """Token stream via a callback-to-queue bridge around a plain ainvoke of the graph."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    config = {**config, "callbacks": [*(config.get("callbacks") or []), _TokenQueueHandler(queue)]}
+
+    async def invoke():
+        try:
+            return await app.ainvoke(graph_input, config=config)
+        finally:
+            queue.put_nowait(done)
+
+    task = asyncio.create_task(invoke())
+    streamed = False
+    try:
+        while True:
+            token = await queue.get()
+            if token is done:
+                break
+            streamed = True
+            yield token
+        result = await task  # re-raises graph errors
+        if not streamed:
+            # Model didn't stream (no token callbacks): send the final answer in one piece
+            final = result["messages"][-1] if result and result.get("messages") else None
+            if isinstance(final, AIMessage) and isinstance(final.content, str) and final.content:
+                yield final.content
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+TOKEN_STREAMS = {"events": iter_tokens_events, "messages": iter_tokens_messages, "callback": iter_tokens_callback}
+
+
+async def _stream_agent_turn(session_id: str, message: str, turn: TurnStream) -> None:
+    print(f"[Stream] Starting token stream ({CHAT_STREAM_MODE}) for session {session_id}...")
+    # Look up PS/model numbers from the message while the first LLM call decides what to search
+    keyword_prefetcher.start(session_id, message)
+    decision = route_turn(message)
+    usage = _UsageHandler()
+    started = time.monotonic()
+    tier_labels = {"tier": decision.tier}
+    try:
+        entry, created = get_or_create_session_agent(session_id)
+        if created:
+            await record_new_session(session_id)
+        app, handler = get_session_app(session_id, entry, decision.tier), entry["handler"]
+        tier_decisions.inc(labels={"tier": decision.tier, "reason": decision.reason})
+        print(f"[Stream] Session {session_id} routed to {decision.tier} tier ({decision.reason}, confidence {decision.confidence:.2f}).")
+        graph_input = {"messages": [HumanMessage(content=message)]}
+        config = {
+            "configurable": {"thread_id": session_id},
+            "recursion_limit": 15,
+            "callbacks": [handler, usage],
+        }
+
+        token_counter = 0
+        async for token in TOKEN_STREAMS[CHAT_STREAM_MODE](app, graph_input, config):
+            token_counter += 1
+            turn.publish({
+                "type": "token",
+                "content": token,
+                "session_id": session_id
+            })
+
+        print(f"[Stream] Completed successfully after {token_counter} tokens for session {session_id}.")
+        turn.publish({"type": "done", "session_id": session_id})
+        tier_turns.inc(labels={**tier_labels, "outcome": "ok"})
+
+    except asyncio.CancelledError:
+        print(f"[Stream] Turn cancelled for session {session_id}.")
+        turn.publish({"type": "error", "content": "The response was cancelled.", "session_id": session_id})
+        raise
+    except Exception as e:
+        print(f"[ERROR] Streaming failed for session {session_id}: {type(e).__name__} - {str(e)}")
+        print(traceback.format_exc())
+        turn.publish({
+            "type": "error",
+            "content": f"An error occurred during streaming: {str(e)}",
+            "session_id": session_id
+        })
+        tier_turns.inc(labels={**tier_labels, "outcome": "error"})
+    finally:
+        keyword_prefetcher.finish(session_id)
+        tier_latency.observe(time.monotonic() - started, labels=tier_labels)
+        tier_tokens.inc(usage.input_tokens, labels={**tier_labels, "kind": "input"})
+        tier_tokens.inc(usage.output_tokens, labels={**tier_labels, "kind": "output"})
+        tier_llm_calls.inc(usage.llm_calls, labels=tier_labels)
+
+
+def start_turn_in_background(session_id: str, message: str) -> TurnStream:
+    """Admits an agent turn, starts it as a background task and returns its buffer for streaming.
+
+    Raises TurnRejectedError when this process is at its stream limit or the session
+    can't take another turn; callers should answer 429 with Retry-After.
+    """
+    admission_controller.admit()
+    try:
+        slot = session_turns.reserve(session_id)
+    except TurnRejectedError:
+        admission_controller.release()
+        raise
+    turn = stream_buffer.start_turn(session_id)
+    task = asyncio.create_task(run_turn(session_id, message, turn, slot=slot))
+    turn.task = task
+    background_turns.add(task)
+    task.add_done_callback(background_turns.discard)
+    task.add_done_callback(lambda _: admission_controller.release())
+    return turn
+
+
+async def drain_turns(timeout: float) -> int:
+    """Waits up to `timeout` seconds for background turns to finish; returns how many were still running."""
+    if not background_turns:
+        return 0
+    print(f"[Runner] Draining {len(background_turns)} in-flight turns (up to {timeout}s).")
+    _done, pending = await asyncio.wait(set(background_turns), timeout=timeout)
+    # Cancelled turns publish an error event, so clients following them from Redis get a terminal frame
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await stream_buffer.drain()
+    return len(pending)
@@ -0,0 +1,117 @@
+"""Offline stand-ins for the remote LLM and web search, used by benchmarks and local runs.
+
+`LocalChatModel` behaves like a tool-calling chat model without any network access:
+on a new user message it can call `SearchPartSelectKeywords` with the message text,
+and once the tool answered it streams a reply built from the tool output.
+`LocalSearch` answers PartSelect keyword searches with deterministic made-up listings.
+Select them with LLM_BACKEND=local and SEARCH_BACKEND=local.
+"""
+import hashlib
+import json
+import uuid
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class LocalChatModel(BaseChatModel):
+    # Like ChatDeepSeek(streaming=True): generate via the token stream so callbacks see every token
+    streaming: bool = True
+    # Call the search tool before answering new user messages
+    call_tools: bool = True
+    # If set, the reply is exactly this many word tokens (handy for per-token benchmarks)
+    reply_words: int = 0
+    # Cap on how much tool output is echoed into the reply
+    max_reply_chars: int = 600
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-standin"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "LocalChatModel":
+        # Tools are called by name below; nothing to bind
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1]
+        if self.call_tools and isinstance(last, HumanMessage):
+            return AIMessage(content="", tool_calls=[{
+                "name": "SearchPartSelectKeywords",
+                "args": {"__arg1": str(last.content)},
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+            }])
+
+        if self.reply_words:
+            return AIMessage(content=" ".join(f"token{i}" for i in range(self.reply_words)))
+
+        question = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        tool_output = str(last.content) if isinstance(last, ToolMessage) else ""
+        reply = f"Here is what I found for \"{question}\"."
+        if tool_output:
+            reply += f"\n{tool_output[:self.max_reply_chars]}"
+        reply += "\nPlease verify details on PartSelect.com."
+        return AIMessage(content=reply)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        message = self._respond(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}
+                for call in message.tool_calls
+            ]))
+            return
+
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._chunks(messages):
+            if run_manager and chunk.message.content:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self._chunks(messages):
+            if run_manager and chunk.message.content:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+class LocalSearch:
+    """Drop-in for GoogleSearchAPIWrapper.run: one fake PartSelect listing per PS/model number in the query."""
+
+    def run(self, query: str) -> str:
+        from .prefetch import extract_identifiers
+
+        identifiers = extract_identifiers(query) or [("query", " ".join(query.replace("site:partselect.com", "").split()))]
+        listings = []
+        for kind, identifier in identifiers:
+            # Stable per identifier, so repeated searches (and cache hits) look the same
+            seed = int(hashlib.blake2b(identifier.encode("utf-8"), digest_size=4).hexdigest(), 16)
+            price = 10 + seed % 190 + (seed % 100) / 100
+            if kind == "part":
+                listings.append(f"{identifier} Replacement Part - ${price:.2f} - In Stock - https://www.partselect.com/{identifier}.htm")
+            elif kind == "model":
+                listings.append(f"{identifier} Parts - Shop {seed % 400 + 50} genuine parts for model {identifier} - https://www.partselect.com/Models/{identifier}/")
+            else:
+                listings.append(f"Results for {identifier} - Refrigerator and dishwasher parts - https://www.partselect.com/")
+        return "\n".join(listings)
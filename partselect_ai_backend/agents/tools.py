@@ -1,29 +1,89 @@
 import uuid
 import re
-import json
-import requests
 import os
-from redis import Redis
-from bs4 import BeautifulSoup
-from urllib.parse import quote_plus
-from langchain_core.tools import Tool
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from datetime import datetime
+from metrics import metrics
 from redis_manager import redis_manager
-from langchain_google_community import GoogleSearchAPIWrapper # Ensure this is imported
-from typing import Optional, Dict, List # Import Optional
+from repair_index import search_guides
+from compatibility import check_compatibility
+from .prefetch import MODEL_NUMBER, PS_NUMBER, SearchPrefetcher
+from typing import Optional, Dict, List, Tuple # Import Optional
 
 load_dotenv()
 
-search = GoogleSearchAPIWrapper()
+# "local" answers searches with the offline LocalSearch stand-in instead of Google
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "google").lower()
+# Keyword search results are shared by every session in the process for this long (0 disables)
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+search_cache_lookups = metrics.counter("search_cache_lookups_total", "Keyword searches by cache outcome (hit|miss).")
+
+_search = None
+_search_lock = threading.Lock()
+# normalized query -> (expires_at, results); insertion-ordered for eviction
+_search_cache: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+
+def get_search():
+    """The search client (Google, or the local stand-in), built on first use so importing the tools stays cheap."""
+    global _search
+    with _search_lock:
+        if _search is None:
+            if SEARCH_BACKEND == "local":
+                from .standins import LocalSearch
+                _search = LocalSearch()
+            else:
+                from langchain_google_community import GoogleSearchAPIWrapper
+                _search = GoogleSearchAPIWrapper()
+    return _search
+
+
+def _keyword_search(query: str) -> Optional[str]:
+    """Raw PartSelect-restricted search; None when nothing useful was found. Cached across sessions."""
+    key = " ".join(query.lower().split())
+    now = time.monotonic()
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached and cached[0] > now:
+            search_cache_lookups.inc(labels={"outcome": "hit"})
+            return cached[1]
+    search_cache_lookups.inc(labels={"outcome": "miss"})
+
+    results = get_search().run(f"site:partselect.com {query}")
+    if not results or "No good Google Search Result was found" in results:
+        results = None
+    if SEARCH_CACHE_TTL > 0:
+        with _search_cache_lock:
+            _search_cache[key] = (now + SEARCH_CACHE_TTL, results)
+            _search_cache.move_to_end(key)
+            while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                _search_cache.popitem(last=False)
+    return results
+
+
+def _prefetch_search(identifier: str) -> Optional[str]:
+    try:
+        return _keyword_search(identifier)
+    except Exception as e:
+        print(f"[Prefetch] Search for {identifier} failed: {e}")
+        return None
+
+
+# Searches started for PS/model numbers in the user's message before the agent asks for them
+keyword_prefetcher = SearchPrefetcher(_prefetch_search)
 
 
 def search_partselect_keywords(query: str) -> str:
     print(f"[Tool] Executing Keyword Search for: {query}")
     try:
-        search_query = f"site:partselect.com {query}"
-        results = search.run(search_query)
-        if not results or "No good Google Search Result was found" in results:
+        results = keyword_prefetcher.take(query) or _keyword_search(query)
+        if not results:
             return f"❌ No results found on PartSelect for '{query}' using keyword search."
         return f"Keyword search results for '{query}' (summarize relevant parts):\n{results}" # Limit result length
     except Exception as e:
@@ -31,6 +91,68 @@ def search_partselect_keywords(query: str) -> str:
         return f"⚠️ An error occurred during keyword search: {str(e)}"
 
 
+def search_repair_guides(tool_input) -> str:
+    """
+    Ranked troubleshooting steps and candidate parts from the local repair-guide index.
+    Accepts the symptom as a string, or a dictionary with 'query' and optional 'appliance'.
+    """
+    if isinstance(tool_input, dict):
+        query = tool_input.get("query") or tool_input.get("__arg1") or ""
+        appliance = (tool_input.get("appliance") or "").lower() or None
+    else:
+        query, appliance = str(tool_input), None
+    if not query.strip():
+        return "❌ Error: describe the symptom to search repair guides."
+
+    print(f"[Tool] Searching repair guides for: {query}")
+    results = search_guides(query, appliance=appliance)
+    if results is None:
+        return "⚠️ Repair guides are unavailable right now. Use SearchPartSelectKeywords instead."
+    if not results:
+        return f"❌ No repair guide matched '{query}'. Use SearchPartSelectKeywords instead."
+
+    lines = [f"Repair guide matches for '{query}' (most relevant first):"]
+    for rank, result in enumerate(results, start=1):
+        lines.append(f"{rank}. {result['title']} – {result['section']} ({result['appliance']})")
+        lines.extend(f"   {i}. {step}" for i, step in enumerate(result["steps"], start=1))
+        if result["parts"]:
+            lines.append(f"   Candidate parts: {', '.join(result['parts'])}")
+        if result["part_numbers"]:
+            lines.append(f"   PS numbers: {', '.join(result['part_numbers'])}")
+    lines.append("(Use SearchPartSelectKeywords to find PS numbers and links for candidate parts.)")
+    return "\n".join(lines)
+
+
+def check_part_compatibility(tool_input) -> str:
+    """
+    Checks a part against a model in the precomputed compatibility catalog.
+    Accepts a dictionary with 'part_number' and 'model_number', or a string containing both.
+    """
+    if isinstance(tool_input, dict) and "__arg1" not in tool_input:
+        part_number = tool_input.get("part_number") or ""
+        model_number = tool_input.get("model_number") or ""
+    else:
+        text = tool_input.get("__arg1", "") if isinstance(tool_input, dict) else str(tool_input)
+        part_match = PS_NUMBER.search(text)
+        part_number = part_match.group(0) if part_match else ""
+        models = [m for m in MODEL_NUMBER.findall(text) if not PS_NUMBER.fullmatch(m)]
+        model_number = models[0] if models else ""
+    if not part_number or not model_number:
+        return "❌ Error: both a PS part number and an appliance model number are needed to check compatibility."
+
+    result = check_compatibility(model_number, part_number)
+    if result is None:
+        return "⚠️ Compatibility data is unavailable. Use SearchPartSelectKeywords instead."
+    part, model = result["part_number"], result["model_number"]
+    part_label = f"**{part}** ({result['part_name']})" if result["part_name"] else f"**{part}**"
+    if result["compatible"]:
+        return f"✅ {part_label} is listed as compatible with model **{model}** in the PartSelect catalog."
+    if result["model_known"]:
+        return (f"❌ {part_label} is not listed as compatible with model **{model}** in the PartSelect catalog. "
+                f"Suggest verifying on PartSelect.com or searching for the right part for this model.")
+    return f"❓ Model **{model}** is not in the compatibility catalog. Use SearchPartSelectKeywords to check."
+
+
 def add_to_cart(tool_input: dict) -> str:
     """
     Simplified: Adds or updates a part in the shopping cart.
@@ -0,0 +1,256 @@
+"""Batch question answering: NDJSON questions in, NDJSON answers out.
+
+Each input line is a JSON object with a `message` and optionally an `id`. Every question
+runs as an independent agent turn in its own generated `batch-*` session (fresh memory and
+an empty cart, never a live user's), at most `concurrency` at a time. Each turn also takes a
+stream slot from the process-wide admission controller, leaving `BATCH_RESERVED_STREAMS`
+free for interactive chat, and is bounded by `timeout` seconds including the wait for that
+slot. Results are written in completion order; the last line is a throughput/latency summary.
+
+    uv run python batch.py questions.ndjson -o answers.ndjson --concurrency 16 --timeout 120
+    LLM_BACKEND=local SEARCH_BACKEND=local uv run python batch.py questions.ndjson   # offline dry run
+
+The same runner backs `POST /batch/answers` (routes/batch.py).
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import fastjson  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Upper bound for the concurrency a caller may ask for (API and CLI)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "120"))
+# Largest NDJSON body POST /batch/answers accepts; the API holds the whole body in memory
+BATCH_MAX_BODY_BYTES = int(os.getenv("BATCH_MAX_BODY_BYTES", str(8 * 1024 * 1024)))
+# Streams of MAX_INFLIGHT_STREAMS that batch items leave to interactive turns
+BATCH_RESERVED_STREAMS = int(os.getenv("BATCH_RESERVED_STREAMS", "8"))
+# How often an item waiting for a stream slot checks again
+BATCH_ADMISSION_POLL = 0.25
+
+batch_items = metrics.counter("batch_items_total", "Batch questions answered, by status.")
+batch_item_latency = metrics.histogram("batch_item_seconds", "Wall time per batch question.")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _parse_item(index: int, line: str) -> Dict[str, Any]:
+    item = fastjson.loads(line)
+    if not isinstance(item, dict) or not isinstance(item.get("message"), str) or not item["message"].strip():
+        raise ValueError("each line must be a JSON object with a non-empty 'message'")
+    return {"id": item.get("id", index), "message": item["message"]}
+
+
+async def _admit(deadline: float) -> bool:
+    """Waits for a stream slot until `deadline` (monotonic); False if none freed up in time."""
+    from concurrency import admission_controller
+
+    # Always leave interactive turns at least one slot
+    reserve = max(0, min(BATCH_RESERVED_STREAMS, admission_controller.max_inflight - 1))
+    while not admission_controller.try_admit(reserve):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(BATCH_ADMISSION_POLL, remaining))
+    return True
+
+
+async def answer_item(index: int, line: str, timeout: float) -> Dict[str, Any]:
+    """Answers one NDJSON line; never raises. Timed-out items keep the tokens streamed so far."""
+    from langchain_core.messages import HumanMessage
+
+    from agents.agent import build_agent_for_session
+    from agents.model_router import route_turn
+    from agents.runner import iter_tokens_callback
+    from agents.tools import keyword_prefetcher
+    from concurrency import admission_controller
+
+    try:
+        item = _parse_item(index, line)
+    except ValueError as e:
+        batch_items.inc(labels={"status": "invalid"})
+        return {"type": "result", "id": index, "status": "invalid", "error": str(e)}
+
+    # Never a caller-supplied session: the agent's tools write carts, and batch turns skip the session gate
+    session_id, message = f"batch-{uuid.uuid4()}", item["message"]
+    decision = route_turn(message)
+    tokens: List[str] = []
+    started = time.monotonic()
+
+    async def collect() -> None:
+        # A throwaway graph and memory: batch turns are independent and leave nothing cached behind
+        app, _ = build_agent_for_session(session_id, tier=decision.tier)
+        graph_input = {"messages": [HumanMessage(content=message)]}
+        config = {"configurable": {"thread_id": session_id}, "recursion_limit": 15}
+        async for token in iter_tokens_callback(app, graph_input, config):
+            tokens.append(token)
+
+    record: Dict[str, Any] = {"type": "result", "id": item["id"], "session_id": session_id, "tier": decision.tier}
+    if not await _admit(started + timeout):
+        record["status"] = "rejected"
+        record["error"] = f"no stream slot freed up within {timeout:g}s"
+    else:
+        try:
+            keyword_prefetcher.start(session_id, message)
+            await asyncio.wait_for(collect(), timeout=max(started + timeout - time.monotonic(), 0))
+            record["status"] = "ok"
+        except asyncio.TimeoutError:
+            record["status"] = "timeout"
+        except Exception as e:
+            print(f"[Batch] Item {item['id']!r} failed: {type(e).__name__} - {e}", file=sys.stderr)
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            keyword_prefetcher.finish(session_id)
+            admission_controller.release()
+    elapsed = time.monotonic() - started
+    record["answer"] = "".join(tokens)
+    record["partial"] = record["status"] != "ok" and bool(tokens)
+    record["seconds"] = round(elapsed, 3)
+    batch_items.inc(labels={"status": record["status"]})
+    batch_item_latency.observe(elapsed)
+    return record
+
+
+class BatchStats:
+    def __init__(self, concurrency: int, timeout: float):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.statuses: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self.answer_chars = 0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.statuses[record["status"]] = self.statuses.get(record["status"], 0) + 1
+        if "seconds" in record:
+            self.latencies.append(record["seconds"])
+        self.answer_chars += len(record.get("answer") or "")
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        items = sum(self.statuses.values())
+        return {
+            "type": "summary",
+            "items": items,
+            **{status: self.statuses.get(status, 0) for status in ("ok", "timeout", "rejected", "error", "invalid")},
+            "concurrency": self.concurrency,
+            "item_timeout": self.timeout,
+            "seconds": round(elapsed, 3),
+            "items_per_second": round(items / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_p50": round(_percentile(self.latencies, 50), 3),
+            "latency_p95": round(_percentile(self.latencies, 95), 3),
+            "latency_p99": round(_percentile(self.latencies, 99), 3),
+            "latency_max": round(max(self.latencies, default=0.0), 3),
+            "answer_chars": self.answer_chars,
+        }
+
+
+async def run_batch(lines: AsyncIterator[str], concurrency: int = BATCH_CONCURRENCY,
+                    timeout: float = BATCH_ITEM_TIMEOUT) -> AsyncIterator[Dict[str, Any]]:
+    """Yields one result per non-blank input line as it finishes, then the summary.
+
+    Input is read only as fast as slots free up and a slot is held until its result has
+    been handed to the consumer, so memory stays bounded by `concurrency` for any input size.
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    stats = BatchStats(concurrency, timeout)
+    slots = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    finished = object()
+    running = set()
+
+    async def run_item(index: int, line: str) -> None:
+        try:
+            await results.put(await answer_item(index, line, timeout))
+        finally:
+            slots.release()
+
+    async def feed() -> None:
+        try:
+            index = 0
+            async for line in lines:
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(run_item(index, line))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                index += 1
+            if running:
+                await asyncio.gather(*list(running))
+        finally:
+            await results.put(finished)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while (record := await results.get()) is not finished:
+            stats.add(record)
+            yield record
+        await feeder  # surfaces input errors
+    finally:
+        # Consumer went away (client disconnected): stop reading input and abandon running items
+        for task in [feeder, *running]:
+            task.cancel()
+    yield stats.summary()
+
+
+async def _iter_lines(source: Iterable[str]) -> AsyncIterator[str]:
+    for line in source:
+        yield line
+        await asyncio.sleep(0)
+
+
+async def _main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="NDJSON file with one question per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Where to write NDJSON results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=BATCH_ITEM_TIMEOUT, help="Seconds per question")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    summary: Optional[Dict[str, Any]] = None
+    try:
+        # Agent and tool logs go to stderr so stdout carries only NDJSON
+        with contextlib.redirect_stdout(sys.stderr):
+            async for record in run_batch(_iter_lines(source), args.concurrency, args.timeout):
+                output.write(fastjson.dumps(record) + "\n")
+                if record["type"] == "summary":
+                    summary = record
+                else:
+                    output.flush()
+    finally:
+        for stream in (source, output):
+            if stream not in (sys.stdin, sys.stdout):
+                stream.close()
+
+    print(
+        f"[Batch] {summary['items']} items in {summary['seconds']}s ({summary['items_per_second']}/s): "
+        f"{summary['ok']} ok, {summary['timeout']} timeout, {summary['rejected']} rejected, {summary['error']} error, "
+        f"{summary['invalid']} invalid; "
+        f"latency p50 {summary['latency_p50']}s, p95 {summary['latency_p95']}s, max {summary['latency_max']}s",
+        file=sys.stderr,
+    )
+    return 0 if summary["error"] == summary["rejected"] == summary["invalid"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
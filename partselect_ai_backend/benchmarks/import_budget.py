@@ -0,0 +1,77 @@
+"""Checks that importing the API app stays cheap: `import main` must not load the agent stack.
+
+Fails (exit 1) if any module in HEAVY_MODULES is imported by `import main`, or if the median
+import time over --runs fresh interpreters exceeds --budget-ms. The heavy stack loads later,
+on the first chat turn or during the /readyz warm-up.
+
+    uv run python benchmarks/import_budget.py --budget-ms 1000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = (
+    "langchain_core",
+    "langgraph",
+    "langchain_deepseek",
+    "langchain_openai",
+    "langchain_google_community",
+    "googleapiclient",
+    "numpy",
+    "bs4",
+    "requests",
+)
+
+_PROBE = """
+import sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(f"{{elapsed * 1000:.1f}} {{','.join(heavy)}}")
+"""
+
+
+def probe() -> tuple:
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    elapsed, _, heavy = output.partition(" ")
+    return float(elapsed), [m for m in heavy.split(",") if m]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1000")))
+    args = parser.parse_args()
+
+    probe()  # warm the filesystem cache and .pyc files
+    timings, heavy = [], set()
+    for _ in range(args.runs):
+        elapsed, loaded = probe()
+        timings.append(elapsed)
+        heavy.update(loaded)
+
+    median = statistics.median(timings)
+    print(f"import main: median {median:.1f} ms, min {min(timings):.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(sorted(heavy))}")
+        failed = True
+    if median > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
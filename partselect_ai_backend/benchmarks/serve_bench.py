@@ -0,0 +1,200 @@
+"""Requests/sec and concurrent streams per core for the production server (`python main.py`).
+
+For each --workers value it starts `main.py` with WEB_CONCURRENCY set, drives --path with
+--concurrency keep-alive clients for --duration seconds, optionally holds --streams
+/stream_chat responses open at once, then stops the server with SIGTERM and times the drain.
+
+    uv run python benchmarks/serve_bench.py --workers 1,2,4 --duration 10 --concurrency 64
+    uv run python benchmarks/serve_bench.py --url http://staging:8000 --streams 200
+
+The load generator is Python too: give it its own cores (or pin the server with taskset),
+otherwise it, not the server, is what gets measured. Streams call whatever LLM the server
+is configured with, so their numbers include that backend's latency. `cpu us/req` is the
+server's own CPU time (all workers, from /proc) per request: unlike req/s it doesn't depend
+on the client, so it is the number to compare server stacks by on a shared machine.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def wait_until_up(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/healthz")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+async def drive_requests(base_url: str, path: str, concurrency: int, duration: float) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10) as client:
+        deadline = time.monotonic() + duration
+
+        async def client_loop() -> None:
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return {
+        "requests": len(latencies) + errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+
+async def hold_streams(base_url: str, streams: int, message: str) -> dict:
+    first_byte: List[float] = []
+    completed = 0
+    errors = 0
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=streams)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+
+        async def one_stream() -> None:
+            nonlocal completed, errors
+            started = time.perf_counter()
+            params = {"message": message, "session_id": str(uuid.uuid4())}
+            try:
+                async with client.stream("GET", "/stream_chat", params=params) as response:
+                    response.raise_for_status()
+                    seen_first = False
+                    async for line in response.aiter_lines():
+                        if not seen_first and line.startswith("data:"):
+                            first_byte.append(time.perf_counter() - started)
+                            seen_first = True
+                completed += 1
+            except httpx.HTTPError:
+                errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(one_stream() for _ in range(streams)))
+        elapsed = time.monotonic() - started
+    return {
+        "completed": completed,
+        "errors": errors,
+        "ttfb_p50_ms": percentile(first_byte, 50) * 1000,
+        "ttfb_p99_ms": percentile(first_byte, 99) * 1000,
+        "seconds": elapsed,
+    }
+
+
+def server_cpu_seconds(pid: int) -> Optional[float]:
+    """User+system CPU time of the server process and its workers (Linux /proc); None elsewhere."""
+    ticks = os.sysconf("SC_CLK_TCK")
+    total, pending = 0, [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])  # utime, stime
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError, AttributeError):
+        return None
+    return total / ticks
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(port), "PYTHONUNBUFFERED": "1"}
+    return subprocess.Popen([sys.executable, "main.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(process: subprocess.Popen) -> float:
+    started = time.monotonic()
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=120)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    return time.monotonic() - started
+
+
+async def bench(base_url: str, workers: Optional[int], args, pid: Optional[int] = None) -> None:
+    await wait_until_up(base_url)
+    # Warm connections, imports and caches before measuring
+    await drive_requests(base_url, args.path, args.concurrency, 1)
+    cpu_before = server_cpu_seconds(pid) if pid else None
+    result = await drive_requests(base_url, args.path, args.concurrency, args.duration)
+    cpu_after = server_cpu_seconds(pid) if pid else None
+    label = str(workers) if workers else "-"
+    per_core = f"{result['rps'] / workers:>10.0f}" if workers else f"{'-':>10}"
+    # Server CPU per request doesn't depend on how fast the client is, so stacks compare even on shared cores
+    cpu_us = f"{'-':>12}"
+    if cpu_before is not None and cpu_after is not None and result["requests"]:
+        cpu_us = f"{(cpu_after - cpu_before) / result['requests'] * 1e6:>12.0f}"
+    print(f"{label:>8}{result['rps']:>10.0f}{per_core}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{cpu_us}{result['errors']:>8}")
+    if args.streams:
+        streams = await hold_streams(base_url, args.streams, args.message)
+        per_core = f" ({args.streams / workers:.0f} per worker)" if workers else ""
+        print(f"{'':>8}{args.streams} concurrent streams{per_core}: {streams['completed']} completed, "
+              f"{streams['errors']} errors, TTFB p50 {streams['ttfb_p50_ms']:.0f} ms / p99 {streams['ttfb_p99_ms']:.0f} ms, "
+              f"{streams['seconds']:.1f}s total")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1", help="Comma-separated worker counts to start main.py with")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/healthz", help="Endpoint driven for requests/sec")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--streams", type=int, default=0, help="Concurrent /stream_chat responses to hold open (0: skip)")
+    parser.add_argument("--message", default="Is PS11752778 compatible with WRS325SDHZ?")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'req/s':>10}{'req/s/wkr':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu us/req':>12}{'errors':>8}")
+    if args.url:
+        await bench(args.url.rstrip("/"), None, args)
+        return
+    for workers in (int(w) for w in args.workers.split(",")):
+        process = start_server(workers, args.port)
+        try:
+            await bench(f"http://127.0.0.1:{args.port}", workers, args, process.pid)
+        finally:
+            drain = stop_server(process)
+        print(f"{'':>8}SIGTERM to exit: {drain:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""CPU and allocation cost per streamed token for each CHAT_STREAM_MODE token path.
+
+Runs the real agent graph (agents/agent.py) against the offline LocalChatModel, so the
+numbers isolate LangGraph/LangChain streaming overhead from network and LLM latency.
+
+    uv run python benchmarks/stream_bench.py --turns 20 --words 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from agents.agent import build_agent_for_session  # noqa: E402
+from agents.runner import TOKEN_STREAMS  # noqa: E402
+from agents.standins import LocalChatModel  # noqa: E402
+
+
+async def run_turns(mode: str, turns: int, words: int, trace_memory: bool) -> dict:
+    model = LocalChatModel(call_tools=False, reply_words=words)
+    tokens = 0
+    peak = 0
+    cpu = 0.0
+    for i in range(turns):
+        # A fresh session per turn keeps the checkpoint history (and its copying cost) constant
+        app, _ = build_agent_for_session(f"bench-{mode}-{i}", model=model)
+        graph_input = {"messages": [HumanMessage(content="Will PS11752778 fit my WRS325SDHZ?")]}
+        config = {"configurable": {"thread_id": f"bench-{mode}-{i}"}, "recursion_limit": 15}
+
+        if trace_memory:
+            tracemalloc.start()
+        started = time.process_time()
+        async for _ in TOKEN_STREAMS[mode](app, graph_input, config):
+            tokens += 1
+        cpu += time.process_time() - started
+        if trace_memory:
+            _current, turn_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, turn_peak)
+            tracemalloc.stop()
+    return {"tokens": tokens, "cpu": cpu, "peak": peak}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--words", type=int, default=300, help="Tokens per streamed reply")
+    args = parser.parse_args()
+
+    # Warm imports and caches so the first mode isn't penalised
+    for mode in TOKEN_STREAMS:
+        await run_turns(mode, 1, 10, trace_memory=False)
+
+    print(f"{'mode':<10}{'tokens':>8}{'cpu us/token':>15}{'peak KiB/turn':>16}{'peak B/token':>15}")
+    for mode in TOKEN_STREAMS:
+        timing = await run_turns(mode, args.turns, args.words, trace_memory=False)
+        memory = await run_turns(mode, args.turns, args.words, trace_memory=True)
+        print(
+            f"{mode:<10}{timing['tokens']:>8}"
+            f"{timing['cpu'] / max(timing['tokens'], 1) * 1e6:>15.1f}"
+            f"{memory['peak'] / 1024:>16.1f}"
+            f"{memory['peak'] / max(args.words, 1):>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import os
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from redis_manager import redis_manager
+from stream_buffer import STREAM_BUFFER_TTL
+
+# "inline" runs agent turns inside the API process; "queue" hands them to worker.py processes
+CHAT_EXECUTION_MODE = os.getenv("CHAT_EXECUTION_MODE", "inline").lower()
+# Jobs are sharded by session so one consumer sees all turns of a session, in order
+CHAT_QUEUE_SHARDS = int(os.getenv("CHAT_QUEUE_SHARDS", "4"))
+# Backpressure: API pods reject new turns once a shard holds this many unfinished jobs
+CHAT_QUEUE_MAX_PENDING = int(os.getenv("CHAT_QUEUE_MAX_PENDING", "200"))
+CHAT_QUEUE_GROUP = os.getenv("CHAT_QUEUE_GROUP", "chat-workers")
+CHAT_QUEUE_PREFIX = "chat:jobs"
+
+
+class QueueFullError(Exception):
+    """Raised when a shard is over its pending-job limit; callers should retry later."""
+
+
+def queue_mode_enabled() -> bool:
+    return CHAT_EXECUTION_MODE == "queue"
+
+
+def shard_for(session_id: str) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(session_id.encode("utf-8")) % CHAT_QUEUE_SHARDS
+
+
+def shard_key(shard: int) -> str:
+    return f"{CHAT_QUEUE_PREFIX}:{shard}"
+
+
+def all_shard_keys() -> List[str]:
+    return [shard_key(shard) for shard in range(CHAT_QUEUE_SHARDS)]
+
+
+def enqueue_turn(session_id: str, message: str) -> Optional[Tuple[str, int]]:
+    """Queues a turn for a worker. Returns (job id, turn id), or None if Redis is unavailable.
+
+    The turn id is allocated in Redis rather than from this pod's clock, so it keeps increasing
+    per session across API pods. Blocking; call it from a thread in async code.
+    Raises QueueFullError when the session's shard is over CHAT_QUEUE_MAX_PENDING.
+    """
+    key = shard_key(shard_for(session_id))
+    depth = redis_manager.get_stream_length(key)
+    if depth is False:
+        return None
+    if depth >= CHAT_QUEUE_MAX_PENDING:
+        raise QueueFullError(f"Chat queue shard {key} has {depth} pending jobs")
+    turn_ms = redis_manager.allocate_turn_id(session_id, int(time.time() * 1000), STREAM_BUFFER_TTL)
+    if turn_ms is False:
+        return None
+    job_id = redis_manager.enqueue_chat_job(key, {
+        "session_id": session_id,
+        "message": message,
+        "turn": str(turn_ms),
+    })
+    return (job_id, turn_ms) if job_id else None
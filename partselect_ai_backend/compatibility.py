@@ -0,0 +1,243 @@
+"""Precomputed model <-> part compatibility built from a catalog dump.
+
+The dump is a CSV with `model_number` and `part_number` columns (optionally `part_name`),
+one row per compatible pair. Models and parts become sorted fixed-width string arrays, and
+both directions are CSR adjacency arrays, so every check is a binary search over
+memory-mapped .npy files. With COMPAT_BACKEND=redis the same pairs are also loaded into one
+Redis set per model and per part (scoped to the index generation), and membership checks
+become SISMEMBER calls.
+
+    uv run python compatibility.py build catalog.csv [--redis]
+    uv run python compatibility.py check WRS325SDHZ PS11752778
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+from redis_manager import redis_manager
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+COMPAT_INDEX_DIR = os.getenv("COMPAT_INDEX_DIR", os.path.join(_HERE, "data", "compat_index"))
+# "local" answers from the memory-mapped arrays; "redis" asks Redis first and falls back to them
+COMPAT_BACKEND = os.getenv("COMPAT_BACKEND", "local").lower()
+COMPAT_LIST_LIMIT = int(os.getenv("COMPAT_LIST_LIMIT", "50"))
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+compat_lookups = metrics.counter("compat_lookups_total", "Compatibility checks by backend and result.")
+
+
+def normalize_model(model: str) -> str:
+    return _NON_ALNUM.sub("", str(model).upper())
+
+
+def normalize_part(part: str) -> str:
+    """'ps-11752778' and '11752778' both become 'PS11752778'; other part numbers are just upper-cased."""
+    part = _NON_ALNUM.sub("", str(part).upper())
+    return f"PS{part}" if part.isdigit() else part
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, n_rows: int):
+    """CSR adjacency with each row's columns sorted, so rows can be binary-searched too."""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+def build_compat_index(catalog_path: str, index_dir: str = COMPAT_INDEX_DIR) -> Dict[str, Any]:
+    """Builds the arrays from a catalog CSV into a new generation and swaps the manifest atomically."""
+    pairs = set()
+    names: Dict[str, str] = {}
+    with open(catalog_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            model = normalize_model(row.get("model_number", ""))
+            part = normalize_part(row.get("part_number", ""))
+            if not model or not part:
+                continue
+            pairs.add((model, part))
+            if row.get("part_name"):
+                names.setdefault(part, row["part_name"].strip())
+
+    models = np.array(sorted({m for m, _ in pairs}))
+    parts = np.array(sorted({p for _, p in pairs}))
+    pair_models = np.array([m for m, _ in pairs])
+    pair_parts = np.array([p for _, p in pairs])
+    model_ids = np.searchsorted(models, pair_models) if len(pairs) else np.zeros(0, dtype=np.int64)
+    part_ids = np.searchsorted(parts, pair_parts) if len(pairs) else np.zeros(0, dtype=np.int64)
+    model_indptr, model_parts = _csr(model_ids, part_ids, len(models))
+    part_indptr, part_models = _csr(part_ids, model_ids, len(parts))
+
+    previous = _read_manifest(index_dir)
+    generation = (previous["generation"] + 1) if previous else int(time.time())
+    gen_dir = os.path.join(index_dir, f"gen-{generation}")
+    os.makedirs(gen_dir, exist_ok=True)
+    for name, array in (("models", models), ("parts", parts), ("model_indptr", model_indptr),
+                        ("model_parts", model_parts), ("part_indptr", part_indptr), ("part_models", part_models)):
+        np.save(os.path.join(gen_dir, f"{name}.npy"), array)
+    with open(os.path.join(gen_dir, "part_names.json"), "w", encoding="utf-8") as f:
+        json.dump(names, f)
+
+    manifest = {"generation": generation, "built_at": time.time(), "source": os.path.abspath(catalog_path),
+                "models": len(models), "parts": len(parts), "pairs": len(pairs)}
+    tmp_path = os.path.join(index_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(index_dir, "manifest.json"))
+    # The previous generation stays for processes that read the old manifest but haven't loaded it yet
+    keep = {f"gen-{generation}"} | ({f"gen-{previous['generation']}"} if previous else set())
+    for name in os.listdir(index_dir):
+        if name.startswith("gen-") and name not in keep:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+    print(f"[Compat] Built generation {generation}: {len(models)} models, {len(parts)} parts, {len(pairs)} pairs.")
+    return manifest
+
+
+def _read_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CompatibilityIndex:
+    """A loaded, memory-mapped index generation."""
+
+    def __init__(self, index_dir: str, manifest: Dict[str, Any]):
+        gen_dir = os.path.join(index_dir, f"gen-{manifest['generation']}")
+        self.generation = manifest["generation"]
+        load = lambda name: np.load(os.path.join(gen_dir, f"{name}.npy"), mmap_mode="r")
+        self.models, self.parts = load("models"), load("parts")
+        self.model_indptr, self.model_parts = load("model_indptr"), load("model_parts")
+        self.part_indptr, self.part_models = load("part_indptr"), load("part_models")
+        with open(os.path.join(gen_dir, "part_names.json"), encoding="utf-8") as f:
+            self.part_names: Dict[str, str] = json.load(f)
+
+    @staticmethod
+    def _find(sorted_values: np.ndarray, value: str) -> int:
+        i = int(np.searchsorted(sorted_values, value))
+        return i if i < len(sorted_values) and sorted_values[i] == value else -1
+
+    def check(self, model: str, part: str) -> Dict[str, Any]:
+        """O(log n) membership check of a normalized model/part pair."""
+        model_id, part_id = self._find(self.models, model), self._find(self.parts, part)
+        compatible = False
+        if model_id >= 0 and part_id >= 0:
+            row = self.model_parts[self.model_indptr[model_id]:self.model_indptr[model_id + 1]]
+            j = int(np.searchsorted(row, part_id))
+            compatible = j < len(row) and row[j] == part_id
+        return {"model_known": model_id >= 0, "part_known": part_id >= 0, "compatible": bool(compatible)}
+
+    def parts_for_model(self, model: str, limit: int = COMPAT_LIST_LIMIT) -> Optional[List[str]]:
+        model_id = self._find(self.models, model)
+        if model_id < 0:
+            return None
+        row = self.model_parts[self.model_indptr[model_id]:self.model_indptr[model_id + 1]][:limit]
+        return [str(self.parts[i]) for i in row]
+
+    def models_for_part(self, part: str, limit: int = COMPAT_LIST_LIMIT) -> Optional[List[str]]:
+        part_id = self._find(self.parts, part)
+        if part_id < 0:
+            return None
+        row = self.part_models[self.part_indptr[part_id]:self.part_indptr[part_id + 1]][:limit]
+        return [str(self.models[i]) for i in row]
+
+    def pairs(self):
+        """All (model, part) pairs, used to load the Redis sets."""
+        for model_id, model in enumerate(self.models):
+            for part_id in self.model_parts[self.model_indptr[model_id]:self.model_indptr[model_id + 1]]:
+                yield str(model), str(self.parts[part_id])
+
+
+_index: Optional[CompatibilityIndex] = None
+_index_mtime = 0
+_index_lock = threading.Lock()
+
+
+def get_compat_index() -> Optional[CompatibilityIndex]:
+    """The current index generation, reloaded when `manifest.json` changes; None if none was built."""
+    global _index, _index_mtime
+    with _index_lock:
+        try:
+            mtime = os.stat(os.path.join(COMPAT_INDEX_DIR, "manifest.json")).st_mtime_ns
+        except OSError:
+            return None
+        if _index is None or mtime != _index_mtime:
+            manifest = _read_manifest(COMPAT_INDEX_DIR)
+            if manifest is None:
+                return _index
+            _index = CompatibilityIndex(COMPAT_INDEX_DIR, manifest)
+            _index_mtime = mtime
+            print(f"[Compat] Loaded generation {_index.generation} ({manifest['pairs']} pairs).")
+        return _index
+
+
+def check_compatibility(model: str, part: str) -> Optional[Dict[str, Any]]:
+    """Whether `part` is listed for `model`; None when no compatibility data is available."""
+    model, part = normalize_model(model), normalize_part(part)
+    index = get_compat_index()
+    result, backend = None, "redis"
+    if COMPAT_BACKEND == "redis":
+        result = redis_manager.check_compatibility(model, part)
+    if result is None:
+        if index is None:
+            compat_lookups.inc(labels={"backend": "none", "result": "unavailable"})
+            return None
+        result, backend = index.check(model, part), "local"
+
+    outcome = "compatible" if result["compatible"] else ("not_listed" if result["model_known"] else "unknown_model")
+    compat_lookups.inc(labels={"backend": backend, "result": outcome})
+    name = index.part_names.get(part) if index else None
+    return {"model_number": model, "part_number": part, "part_name": name, **result}
+
+
+def load_into_redis(index: CompatibilityIndex) -> int:
+    """Replaces the Redis compatibility sets with the index's pairs; returns the number of pairs loaded.
+
+    The pairs go into sets scoped to the index generation, which become current in one step;
+    sets of earlier loads, including pairs since dropped from the catalog, are then deleted.
+    """
+    loaded = redis_manager.load_compatibility(index.pairs(), index.generation)
+    print(f"[Compat] Loaded {loaded} pairs into Redis as generation {index.generation}.")
+    return loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the model/part compatibility index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build")
+    build.add_argument("catalog", help="CSV with model_number, part_number[, part_name] columns")
+    build.add_argument("--index", default=COMPAT_INDEX_DIR)
+    build.add_argument("--redis", action="store_true", help="Also load the pairs into Redis sets")
+    check = commands.add_parser("check")
+    check.add_argument("model")
+    check.add_argument("part")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        os.makedirs(args.index, exist_ok=True)
+        print(json.dumps(build_compat_index(args.catalog, args.index)))
+        if args.redis:
+            manifest = _read_manifest(args.index)
+            load_into_redis(CompatibilityIndex(args.index, manifest))
+        return
+
+    started = time.perf_counter()
+    result = check_compatibility(args.model, args.part)
+    print(json.dumps(result))
+    print(f"({(time.perf_counter() - started) * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import uuid
+from collections import defaultdict
+from typing import Dict, Optional
+
+from metrics import metrics
+from redis_manager import redis_manager
+
+# What to do with a turn for a session that is already answering: "queue" waits, "reject" returns 429
+SESSION_TURN_POLICY = os.getenv("SESSION_TURN_POLICY", "queue").lower()
+# With the queue policy, at most this many turns may wait behind the running one
+SESSION_TURN_MAX_QUEUED = int(os.getenv("SESSION_TURN_MAX_QUEUED", "2"))
+# "local" serializes turns within this process; "redis" also across processes/pods sharing Redis
+SESSION_LOCK_BACKEND = os.getenv("SESSION_LOCK_BACKEND", "local").lower()
+SESSION_LOCK_TTL_MS = int(os.getenv("SESSION_LOCK_TTL_MS", "180000"))
+SESSION_LOCK_WAIT = float(os.getenv("SESSION_LOCK_WAIT", "120"))
+# Cap on concurrent LLM streams per worker process; further turns are shed with 429
+MAX_INFLIGHT_STREAMS = int(os.getenv("MAX_INFLIGHT_STREAMS", "64"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+admission_rejected = metrics.counter("chat_admission_rejected_total", "Turns shed by the admission controller.")
+
+
+class TurnRejectedError(Exception):
+    """Raised when a turn can't be admitted; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: int = ADMISSION_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SessionTurnSlot:
+    """A reserved place in a session's turn queue; `async with` waits for the session to be free."""
+
+    def __init__(self, gate: "SessionTurnGate", session_id: str):
+        self.gate = gate
+        self.session_id = session_id
+        self._lock_token: Optional[str] = None
+        self._renewer: Optional[asyncio.Task] = None
+        self._released = False
+
+    async def __aenter__(self) -> "SessionTurnSlot":
+        try:
+            await self.gate._locks[self.session_id].acquire()
+        except BaseException:
+            self.release()
+            raise
+        if self.gate.distributed:
+            try:
+                await self._acquire_distributed()
+            except BaseException:
+                self.gate._locks[self.session_id].release()
+                self.release()
+                raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._renewer:
+            self._renewer.cancel()
+        if self._lock_token:
+            await asyncio.to_thread(redis_manager.release_lock, self._lock_key, self._lock_token)
+        self.gate._locks[self.session_id].release()
+        self.release()
+
+    @property
+    def _lock_key(self) -> str:
+        return f"lock:turn:{self.session_id}"
+
+    async def _acquire_distributed(self) -> None:
+        token = uuid.uuid4().hex
+        deadline = asyncio.get_running_loop().time() + SESSION_LOCK_WAIT
+        delay = 0.05
+        while True:
+            acquired = await asyncio.to_thread(redis_manager.acquire_lock, self._lock_key, token, SESSION_LOCK_TTL_MS)
+            if acquired is None:
+                # Redis unavailable: fall back to the process-local lock we already hold
+                return
+            if acquired:
+                self._lock_token = token
+                self._renewer = asyncio.create_task(self._renew_distributed())
+                return
+            if asyncio.get_running_loop().time() >= deadline:
+                raise TurnRejectedError(f"Session {self.session_id} is busy in another process")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    async def _renew_distributed(self) -> None:
+        """Extends the Redis lock every third of its TTL for as long as the turn runs.
+
+        A turn may outlive SESSION_LOCK_TTL_MS (slow LLM plus tools); without renewal another
+        process could take the lock while this one is still writing checkpoints.
+        """
+        while True:
+            await asyncio.sleep(SESSION_LOCK_TTL_MS / 3000)
+            renewed = await asyncio.to_thread(redis_manager.extend_lock, self._lock_key, self._lock_token, SESSION_LOCK_TTL_MS)
+            if renewed is False:
+                print(f"[SessionLock] Lost the Redis lock for session {self.session_id} to another process while its turn was running.")
+                return
+
+    def release(self) -> None:
+        """Gives up the reservation; safe to call more than once."""
+        if self._released:
+            return
+        self._released = True
+        self.gate._refs[self.session_id] -= 1
+        if not self.gate._refs[self.session_id]:
+            # Nobody else holds or waits on this session's lock
+            del self.gate._refs[self.session_id]
+            self.gate._locks.pop(self.session_id, None)
+
+
+class SessionTurnGate:
+    """Serializes turns per session so two requests never run the same thread_id concurrently."""
+
+    def __init__(self, policy: str = SESSION_TURN_POLICY, max_queued: int = SESSION_TURN_MAX_QUEUED,
+                 distributed: bool = SESSION_LOCK_BACKEND == "redis"):
+        self.policy = policy
+        self.max_queued = max_queued
+        self.distributed = distributed
+        # FIFO asyncio locks, so queued turns run in arrival order
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._refs: Dict[str, int] = defaultdict(int)
+
+    def reserve(self, session_id: str) -> SessionTurnSlot:
+        """Reserves a turn for the session or raises TurnRejectedError per the configured policy."""
+        active = self._refs.get(session_id, 0)
+        if active and self.policy == "reject":
+            raise TurnRejectedError(f"Session {session_id} is already answering a message")
+        if active > self.max_queued:
+            raise TurnRejectedError(f"Session {session_id} has too many queued messages")
+        self._refs[session_id] += 1
+        return SessionTurnSlot(self, session_id)
+
+
+class AdmissionController:
+    """Caps concurrent LLM streams in this process and sheds the excess before latency collapses."""
+
+    def __init__(self, max_inflight: int = MAX_INFLIGHT_STREAMS):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+
+    def admit(self) -> None:
+        if not self.try_admit():
+            admission_rejected.inc()
+            raise TurnRejectedError(f"{self.inflight} streams in flight (limit {self.max_inflight})")
+
+    def try_admit(self, reserve: int = 0) -> bool:
+        """Takes a slot if one is free beyond `reserve`, without counting a rejection (for callers that wait)."""
+        if self.inflight + reserve >= self.max_inflight:
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight = max(self.inflight - 1, 0)
+
+
+session_turns = SessionTurnGate()
+admission_controller = AdmissionController()
+
+metrics.gauge("chat_inflight_streams", "Agent turns currently running in this process.", lambda: admission_controller.inflight)
@@ -0,0 +1,291 @@
+"""Streaming export of sessions, carts and orders as gzip-compressed NDJSON.
+
+Walks the keyspace with SCAN (never KEYS) and reads each batch of keys with one pipelined
+round trip, pacing itself to --max-keys-per-second so production Redis isn't stalled.
+Memory stays constant: records are compressed and written batch by batch.
+
+Every batch is followed by a `{"type": "cursor", "cursor": ...}` line and a gzip sync flush,
+so a truncated file still decompresses up to its last cursor; pass that cursor to --resume
+(or the file to --resume-from) to continue where it stopped. SCAN may return a key twice,
+so deduplicate on (type, id) downstream.
+
+    uv run python export.py -o export.ndjson.gz
+    uv run python export.py -o orders.ndjson.gz --types order --since 2026-10-01T00:00:00
+    uv run python export.py -o rest.ndjson.gz --resume-from export.ndjson.gz
+
+The admin endpoint `GET /admin/export` (routes/admin.py) streams the same output.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import fastjson  # noqa: E402
+from metrics import metrics  # noqa: E402
+from redis_manager import redis_manager  # noqa: E402
+
+EXPORT_TYPES = ("session", "cart", "order")
+# SCAN COUNT hint, and how many keys are read per pipelined round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Read budget against Redis; 0 disables pacing
+EXPORT_MAX_KEYS_PER_SECOND = float(os.getenv("EXPORT_MAX_KEYS_PER_SECOND", "2000"))
+
+export_records = metrics.counter("export_records_total", "Records written by exports, by type.")
+
+
+class ExportError(Exception):
+    """Redis became unavailable mid-export; `cursor` is where to resume."""
+
+    def __init__(self, message: str, cursor: str):
+        super().__init__(message)
+        self.cursor = cursor
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _decode(kind: str, data: Dict[str, str]) -> Dict[str, Any]:
+    """Parses the JSON-encoded fields RedisManager stores inside the hashes."""
+    if kind == "cart":
+        items = {}
+        for part_number, raw in data.items():
+            try:
+                items[part_number] = json.loads(raw)
+            except (json.JSONDecodeError, TypeError):
+                items[part_number] = {"raw": raw}
+        return items
+    if kind == "order" and "items" in data:
+        try:
+            return {**data, "items": json.loads(data["items"] or "{}")}
+        except (json.JSONDecodeError, TypeError):
+            return data
+    return data
+
+
+class _Pacer:
+    """Sleeps between batches so reads stay under `rate` keys per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.started = time.monotonic()
+        self.keys = 0
+
+    def wait(self, keys: int) -> None:
+        self.keys += keys
+        if self.rate > 0:
+            ahead = self.keys / self.rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def _scan_type(kind: str, cursor: int, batch_size: int, pacer: _Pacer) -> Iterator[Tuple[List[Dict[str, Any]], Optional[int]]]:
+    """Batches of one key type; each comes with the SCAN cursor to continue from (None when done)."""
+    while True:
+        page = redis_manager.scan_hashes(f"{kind}:*", cursor, batch_size)
+        if page is None:
+            raise ExportError(f"Redis unavailable while scanning {kind} keys", f"{kind}:{cursor}")
+        cursor, entries = page
+        records = [{"type": kind, "id": key.split(":", 1)[1], "data": _decode(kind, data)} for key, data in entries]
+        pacer.wait(max(len(entries), 1))
+        yield records, cursor or None
+        if cursor == 0:
+            return
+
+
+def _order_position(after: float, skip: Optional[int]) -> str:
+    """`<created>` resumes after that time; `<created>,<n>` at it, past the first n orders created then."""
+    return str(after) if skip is None else f"{after},{skip}"
+
+
+def _parse_order_position(position: str) -> Tuple[float, Optional[int]]:
+    created, _, skip = position.partition(",")
+    return float(created), (int(skip) if skip else None)
+
+
+def _recent_orders(after: float, skip: Optional[int], batch_size: int,
+                   pacer: _Pacer) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+    """Orders created after `after`, from the orders:by_created index instead of a keyspace scan."""
+    until = time.time()
+    while True:
+        page = redis_manager.orders_created_between(after, until, batch_size, skip)
+        if page is None:
+            raise ExportError("Redis unavailable while reading the order index", f"order@{_order_position(after, skip)}")
+        if not page:
+            return
+        values = redis_manager.get_hashes([f"order:{session_id}" for session_id, _ in page])
+        if values is None:
+            raise ExportError("Redis unavailable while reading orders", f"order@{_order_position(after, skip)}")
+        records = [
+            {"type": "order", "id": session_id, "created": created, "data": _decode("order", data)}
+            for (session_id, created), data in zip(page, values) if data
+        ]
+        # Orders sharing the last timestamp may continue on the next page: resume at it, past those seen
+        last = page[-1][1]
+        tied = sum(1 for _, created in page if created == last)
+        skip = skip + tied if skip is not None and last == after else tied
+        after = last
+        pacer.wait(len(page))
+        yield records, _order_position(after, skip)
+
+
+def parse_cursor(cursor: str, types: Tuple[str, ...] = EXPORT_TYPES) -> Tuple[str, str, bool]:
+    """Splits a resume cursor into (type, position, uses the order time index); ValueError if malformed."""
+    indexed = "@" in cursor
+    kind, _, position = cursor.partition("@" if indexed else ":")
+    if kind not in types or (indexed and kind != "order"):
+        raise ValueError(f"Cursor {cursor!r} does not belong to the exported types {', '.join(types)}")
+    _parse_order_position(position) if indexed else int(position)
+    return kind, position, indexed
+
+
+def _cursor_line(cursor: str) -> str:
+    return fastjson.dumps({"type": "cursor", "cursor": cursor}) + "\n"
+
+
+def iter_export(types: Tuple[str, ...] = EXPORT_TYPES, resume: Optional[str] = None, since: Optional[float] = None,
+                batch_size: int = EXPORT_BATCH_SIZE, max_keys_per_second: float = EXPORT_MAX_KEYS_PER_SECOND) -> Iterator[str]:
+    """Yields NDJSON lines: records, a cursor line after every batch, and a final `end` line.
+
+    Cursors are `<type>:<scan cursor>`, or `order@<created>[,<n>]` when orders come from the
+    time index (`since`); resuming skips the types before the cursor's type. If Redis becomes
+    unavailable the last line is `{"type": "error", "cursor": ...}` instead of `end`.
+    """
+    types = tuple(kind for kind in EXPORT_TYPES if kind in types)
+    if not types:
+        yield fastjson.dumps({"type": "end", "records": 0}) + "\n"
+        return
+    start_kind, position = types[0], None
+    if resume:
+        start_kind, position, indexed = parse_cursor(resume, types)
+        if start_kind == "order":
+            # The cursor decides how orders are walked: time index (`order@`) or keyspace scan
+            since = (_parse_order_position(position)[0] if since is None else since) if indexed else None
+
+    pacer = _Pacer(max_keys_per_second)
+    total = 0
+    try:
+        for index, kind in enumerate(types[types.index(start_kind):], start=types.index(start_kind)):
+            start = position if kind == start_kind else None
+            if kind == "order" and since is not None:
+                after, skip = _parse_order_position(start) if start is not None else (since, None)
+                batches, prefix = _recent_orders(after, skip, batch_size, pacer), "order@"
+            else:
+                batches, prefix = _scan_type(kind, int(start or 0), batch_size, pacer), f"{kind}:"
+            for records, next_position in batches:
+                for record in records:
+                    yield fastjson.dumps(record) + "\n"
+                total += len(records)
+                export_records.inc(len(records), labels={"type": kind})
+                if next_position is not None:
+                    yield _cursor_line(f"{prefix}{next_position}")
+            if index + 1 < len(types):
+                # The next type starts from the beginning of its keyspace (or of the time window)
+                following = types[index + 1]
+                yield _cursor_line(f"order@{since}" if following == "order" and since is not None else f"{following}:0")
+    except ExportError as e:
+        print(f"[Export] {e}; resume from {e.cursor}", file=sys.stderr)
+        yield fastjson.dumps({"type": "error", "error": str(e), "cursor": e.cursor}) + "\n"
+        return
+    yield fastjson.dumps({"type": "end", "records": total}) + "\n"
+
+
+def iter_gzip(lines: Iterator[str]) -> Iterator[bytes]:
+    """gzip-compresses NDJSON incrementally, sync-flushing after every cursor and error line."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    pending: List[bytes] = []
+    for line in lines:
+        pending.append(compressor.compress(line.encode("utf-8")))
+        if line.startswith(('{"type":"cursor"', '{"type":"error"')):
+            pending.append(compressor.flush(zlib.Z_SYNC_FLUSH))
+            yield b"".join(pending)
+            pending = []
+    pending.append(compressor.flush())
+    yield b"".join(pending)
+
+
+def last_cursor(path: str) -> Optional[str]:
+    """The last cursor (or error cursor) in a previous, possibly truncated, export file."""
+    cursor = None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as previous:
+            for line in previous:
+                try:
+                    record = fastjson.loads(line)
+                except ValueError:
+                    break  # cut off mid-line
+                if record.get("type") in ("cursor", "error"):
+                    cursor = record["cursor"]
+                elif record.get("type") == "end":
+                    return None
+    except (EOFError, OSError, zlib.error):
+        pass  # truncated stream: keep the last cursor read before the cut
+    return cursor
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", required=True, help="Output .ndjson.gz file ('-' for stdout)")
+    parser.add_argument("--types", default=",".join(EXPORT_TYPES), help="Comma-separated subset of session,cart,order")
+    parser.add_argument("--since", help="Only orders created after this ISO time or epoch (uses the order time index)")
+    parser.add_argument("--resume", help="Cursor to continue from")
+    parser.add_argument("--resume-from", help="Previous export file to continue from (its last cursor)")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--max-keys-per-second", type=float, default=EXPORT_MAX_KEYS_PER_SECOND)
+    args = parser.parse_args()
+
+    types = tuple(kind.strip() for kind in args.types.split(",") if kind.strip())
+    unknown = set(types) - set(EXPORT_TYPES)
+    if unknown:
+        parser.error(f"unknown types: {', '.join(sorted(unknown))}")
+    resume = args.resume
+    if args.resume_from:
+        resume = last_cursor(args.resume_from)
+        if resume is None:
+            print(f"[Export] {args.resume_from} is complete or has no cursor; nothing to resume.", file=sys.stderr)
+            return 0
+        print(f"[Export] Resuming from {resume}.", file=sys.stderr)
+    if resume:
+        try:
+            parse_cursor(resume, types)
+        except ValueError as e:
+            parser.error(str(e))
+
+    lines = iter_export(types, resume=resume, since=parse_since(args.since),
+                        batch_size=args.batch_size, max_keys_per_second=args.max_keys_per_second)
+    outcome = {"failed": False}
+
+    def tracked(source: Iterator[str]) -> Iterator[str]:
+        for line in source:
+            outcome["failed"] = line.startswith('{"type":"error"')
+            yield line
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        # Logs go to stderr so `-o -` carries only the gzip stream
+        with contextlib.redirect_stdout(sys.stderr):
+            for chunk in iter_gzip(tracked(lines)):
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    return 1 if outcome["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
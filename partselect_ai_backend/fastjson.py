@@ -0,0 +1,38 @@
+"""JSON encoding for responses, SSE frames and Redis payloads: orjson when installed, stdlib json otherwise.
+
+Both paths produce compact UTF-8 JSON (no spaces after separators, non-ASCII kept as is),
+so a process with and one without orjson write interchangeable payloads.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as ResponseClass
+
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode("utf-8")
+
+    def dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+
+    loads = orjson.loads
+else:
+    ResponseClass = JSONResponse
+
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)
+
+    def dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+        return dumps(obj, sort_keys=sort_keys).encode("utf-8")
+
+    loads = json.loads
+
+BACKEND = "orjson" if orjson is not None else "json"
@@ -1,17 +1,53 @@
 # main.py
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
 from fastapi import FastAPI
 import os
+import sys
 from dotenv import load_dotenv
+import fastjson
+from agents.llm import close_http_clients
+from chat_queue import queue_mode_enabled
+from routes.admin import admin_router
+from routes.batch import batch_router
+from routes.catalog import catalog_router
 from routes.chat import chat_router
+from routes.health import WARMUP_ON_STARTUP, health_router, start_warmup
+from routes.metrics import metrics_router
+from routes.session import session_router
+from routes.ws import ws_router
+from session_activity import session_activity
 from fastapi.middleware.cors import CORSMiddleware
 
 
 load_dotenv()
 
+# How long shutdown waits for agent turns still running in the background before cancelling them
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        # Runs in the background: the server accepts connections now and /readyz flips once warm
+        start_warmup()
+    yield
+    # Uvicorn has stopped accepting connections and waited for open streams; let detached turns finish too
+    runner = sys.modules.get("agents.runner")
+    if runner is not None:
+        await runner.drain_turns(SHUTDOWN_DRAIN_TIMEOUT)
+    # Write out session activity still waiting for its debounce window
+    await session_activity.stop()
+    await close_http_clients()
+
+
 app = FastAPI(
     title="PartSelect Chat Agent",
     description="Focused chat agent for Refrigerator and Dishwasher parts",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson when installed (see fastjson.py)
+    default_response_class=fastjson.ResponseClass,
 )
 
 
@@ -34,7 +70,58 @@ def home():
 
 
 app.include_router(chat_router)
+app.include_router(catalog_router)
+app.include_router(session_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+app.include_router(ws_router)
+app.include_router(batch_router)
+app.include_router(admin_router)
+
+def _cpu_count() -> int:
+    # Honour CPU affinity/cgroup pinning where the platform exposes it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    """One worker per core in queue mode; a single worker when agent turns run inline.
+
+    Inline turns keep each session's conversation memory in the process that created it,
+    and requests are not routed to a sticky worker, so several workers would split a
+    conversation across processes. In queue mode the API only relays Redis streams.
+    """
+    return _cpu_count() if queue_mode_enabled() else 1
+
+
+def serve() -> None:
+    """Production entry point: `python main.py` (use `uvicorn main:app --reload` for development)."""
+    import uvicorn
+
+    workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+    if workers > 1 and not queue_mode_enabled():
+        print(f"[Serve] Warning: {workers} workers with inline turns; session memory is per worker process.")
+    loop = "uvloop" if find_spec("uvloop") else "asyncio"
+    http = "httptools" if find_spec("httptools") else "h11"
+    print(f"[Serve] {workers} worker(s), loop={loop}, http={http}, json={fastjson.BACKEND}.")
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=int(os.getenv("SERVER_BACKLOG", "2048")),
+        # Longer than a typical load balancer idle timeout (60s), so the proxy closes idle connections first
+        timeout_keep_alive=int(os.getenv("SERVER_KEEPALIVE", "75")),
+        # On SIGTERM: stop accepting, let open streams finish for up to this long, then run shutdown
+        timeout_graceful_shutdown=int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")),
+        log_level=os.getenv("LOG_LEVEL", "info"),
+        access_log=os.getenv("ACCESS_LOG", "False") == "True",
+        proxy_headers=True,
+    )
+
 
 if __name__ == "__main__":
-    DEBUG = os.getenv('DEBUG') == 'True'
-    app.run(debug=DEBUG)
+    serve()
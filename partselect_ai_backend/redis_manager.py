@@ -1,35 +1,254 @@
 # redis_manager.py
+import asyncio
+import inspect
 import json
 import os
+import random
+import threading
+import time
 import uuid
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from redis import Redis
-from redis.exceptions import ConnectionError, RedisError
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ConnectionError, RedisError, TimeoutError
+
+from metrics import metrics
+
+# Per-command timeout; worker XREADGROUP blocks (WORKER_BLOCK_MS) must stay below it
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+# Consecutive connection failures/timeouts that open the circuit breaker
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "3"))
+# Background reconnect backoff while the breaker is open (doubles up to the max, with jitter)
+REDIS_RECONNECT_MIN = float(os.getenv("REDIS_RECONNECT_MIN", "0.5"))
+REDIS_RECONNECT_MAX = float(os.getenv("REDIS_RECONNECT_MAX", "30"))
+# Cart/session writes kept in memory while Redis is down and replayed in order once it is back
+REDIS_WRITE_BUFFER_MAX = int(os.getenv("REDIS_WRITE_BUFFER_MAX", "5000"))
+# Last-known carts, so degraded reads show the cart as it was plus buffered changes
+REDIS_CART_SNAPSHOTS = int(os.getenv("REDIS_CART_SNAPSHOTS", "5000"))
+# Orders by creation time (session ids scored by epoch seconds), for exports of recent orders
+ORDERS_BY_CREATED_KEY = "orders:by_created"
+ORDER_TTL = timedelta(days=14)
+
+CONNECTIVITY_ERRORS = (ConnectionError, TimeoutError)
+BUFFERED_WRITES = ("update_session", "add_to_cart", "clear_cart", "create_order")
+
+breaker_state = metrics.gauge("redis_circuit_state", "Redis circuit breaker state (0=closed, 1=half_open, 2=open).")
+breaker_transitions = metrics.counter("redis_circuit_transitions_total", "Redis circuit breaker transitions, by new state.")
+fast_failures = metrics.counter("redis_fast_failures_total", "Redis calls answered without Redis (breaker not closed), by operation.")
+write_buffer_ops = metrics.counter("redis_write_buffer_total", "Degraded-mode cart/session writes (outcome=buffered|replayed|dropped|failed).")
+
+
+def _failure_default(func_name: str):
+    """Sensible return value for a Redis-backed method when Redis is unavailable."""
+    if "get_cart" in func_name: return {}
+    if "get_order" in func_name: return None
+    if "read_chat_jobs" in func_name or "claim_chat_jobs" in func_name: return []
+    if "acquire_lock" in func_name: return None # Caller falls back to local locking
+    if "extend_lock" in func_name: return None # Unknown; the renewer retries on its next tick
+    if "check_compatibility" in func_name: return None # Caller falls back to the local index
+    if "load_compatibility" in func_name: return 0
+    if func_name in ("scan_hashes", "get_hashes", "orders_created_between"): return None # Export stops at its cursor
+    return False # Default fail for actions
+
+
+class CircuitBreaker:
+    """Stops calling Redis after repeated connection failures and reconnects in the background.
+
+    closed: calls go to Redis. open: calls fail fast while a thread probes Redis with
+    exponential backoff. half_open: Redis answered the probe and buffered writes are being
+    replayed; calls keep failing fast until the replay is done, so writes stay in order.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, recover: Callable[[], bool], failure_threshold: int = REDIS_BREAKER_FAILURES):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.failure_threshold = max(1, failure_threshold)
+        self._recover = recover
+        self._lock = threading.Lock()
+        breaker_state.set(0)
+
+    def allow(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state != self.CLOSED or self.failures < self.failure_threshold:
+                return
+            self._transition(self.OPEN)
+        threading.Thread(target=self._reconnect_loop, name="redis-reconnect", daemon=True).start()
+
+    def transition(self, state: str) -> None:
+        with self._lock:
+            self._transition(state)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        print(f"[Redis] Circuit breaker {self.state} -> {state}")
+        self.state = state
+        if state == self.CLOSED:
+            self.failures = 0
+        breaker_state.set(self._CODES[state])
+        breaker_transitions.inc(labels={"state": state})
+
+    def _reconnect_loop(self) -> None:
+        delay = REDIS_RECONNECT_MIN
+        while True:
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            try:
+                if self._recover():
+                    return
+            except Exception as e:
+                print(f"[Redis] Reconnect attempt failed: {e}")
+                self.transition(self.OPEN)
+            delay = min(delay * 2, REDIS_RECONNECT_MAX)
+
+
+def _apply_cart_write(cart: Dict[str, Dict[str, Any]], name: str, call: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    if name == "add_to_cart":
+        cart[call["part_number"]] = {"quantity": int(call["quantity"]), "name": str(call["name"])}
+    elif name == "clear_cart":
+        cart.clear()
+    return cart
+
+
+class WriteBehindBuffer:
+    """Bounded, ordered log of cart/session writes made while Redis is unavailable.
+
+    Also keeps the degraded view of affected carts (last-known cart plus buffered changes)
+    so ViewCart and GET /cart keep answering during an outage.
+    """
+
+    def __init__(self, max_ops: int = REDIS_WRITE_BUFFER_MAX, max_snapshots: int = REDIS_CART_SNAPSHOTS):
+        self.max_ops = max_ops
+        self.max_snapshots = max_snapshots
+        self.lock = threading.RLock()
+        self._ops: deque = deque()
+        self._overlay: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._snapshots: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def remember(self, name: str, call: Dict[str, Any], result: Any) -> None:
+        """Keeps last-known carts current from successful Redis calls."""
+        session_id = call.get("session_id")
+        with self.lock:
+            if name == "get_cart":
+                self._snapshots[session_id] = {k: dict(v) for k, v in result.items()}
+            elif name in ("add_to_cart", "clear_cart") and session_id in self._snapshots:
+                _apply_cart_write(self._snapshots[session_id], name, call)
+            else:
+                return
+            self._snapshots.move_to_end(session_id)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+    def record(self, name: str, call: Dict[str, Any]) -> bool:
+        with self.lock:
+            if len(self._ops) >= self.max_ops:
+                write_buffer_ops.inc(labels={"outcome": "dropped"})
+                return False
+            self._ops.append((name, call))
+            session_id = call.get("session_id")
+            if name in ("add_to_cart", "clear_cart"):
+                if session_id not in self._overlay:
+                    self._overlay[session_id] = {k: dict(v) for k, v in self._snapshots.get(session_id, {}).items()}
+                _apply_cart_write(self._overlay[session_id], name, call)
+            write_buffer_ops.inc(labels={"outcome": "buffered"})
+            return True
+
+    def cart(self, session_id: str) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            cart = self._overlay.get(session_id, self._snapshots.get(session_id, {}))
+            return {k: dict(v) for k, v in cart.items()}
+
+    def take(self) -> List[tuple]:
+        with self.lock:
+            ops = list(self._ops)
+            self._ops.clear()
+            return ops
+
+    def requeue(self, ops: List[tuple]) -> None:
+        """Puts unreplayed writes back in front of anything buffered meanwhile."""
+        with self.lock:
+            self._ops.extendleft(reversed(ops))
+
+    def settle(self) -> None:
+        """Drops the degraded cart views once everything was replayed; snapshots follow the replayed writes."""
+        with self.lock:
+            for session_id, cart in self._overlay.items():
+                self._snapshots[session_id] = cart
+            self._overlay.clear()
 
 
 class RedisManager:
     def __init__(self):
         self.redis = self._connect()
+        self.async_redis = AsyncRedis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=5,
+            health_check_interval=30
+        )
+        self.breaker = CircuitBreaker(recover=self._recover)
+        self.write_buffer = WriteBehindBuffer()
+        metrics.gauge("redis_write_buffer_size", "Cart/session writes waiting for Redis to come back.", lambda: len(self.write_buffer))
+
+    @property
+    def available(self) -> bool:
+        """Configured and the circuit breaker is closed."""
+        return self.redis is not None and self.breaker.allow()
 
     def _connect(self):
+        """Creates the client without touching the network; the pool connects on first use.
+
+        Connecting (and the old import-time ping) used to block startup for up to the
+        connect timeout when Redis was slow or down. `ping()` is the explicit check.
+        """
         try:
-            redis_instance = Redis.from_url(
+            return Redis.from_url(
                 os.getenv("REDIS_URL", "redis://localhost:6379/0"),
                 decode_responses=True,
-                socket_timeout=5,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
                 socket_connect_timeout=5,
                 health_check_interval=30
             )
-            redis_instance.ping()
-            print("Redis connection successful.")
-            return redis_instance
         except (ConnectionError, RedisError, Exception) as e:
-            print(f"Redis connection error: {str(e)}")
+            print(f"Redis configuration error: {str(e)}")
             return None
 
+    def ping(self) -> bool:
+        """Round trip on the sync pool (opening its first connection); False if Redis is unreachable."""
+        if not self.redis:
+            return False
+        try:
+            self.redis.ping()
+            return True
+        except (ConnectionError, RedisError) as e:
+            print(f"Redis connection error: {str(e)}")
+            return False
+
+    async def aping(self) -> bool:
+        """Same as `ping()` for the async pool used by SSE resume."""
+        try:
+            await self.async_redis.ping()
+            return True
+        except (ConnectionError, RedisError) as e:
+            print(f"Redis (async) connection error: {str(e)}")
+            return False
+
     def _serialize_dict_values(self, data: dict) -> dict:
         """Converts dictionary values to Redis-compatible types (str)."""
         serialized = {}
@@ -41,28 +260,85 @@ class RedisManager:
             else: serialized[k] = str(v)
         return serialized
 
+    def _recover(self) -> bool:
+        """Reconnect probe: replays buffered writes in order, then closes the breaker."""
+        if not self.ping():
+            return False
+        self.breaker.transition(CircuitBreaker.HALF_OPEN)
+        while True:
+            ops = self.write_buffer.take()
+            with self.write_buffer.lock:
+                if not ops:
+                    # Closing under the buffer lock: a write either got buffered before this
+                    # (and was taken above) or will see the closed breaker and go to Redis
+                    self.write_buffer.settle()
+                    self.breaker.transition(CircuitBreaker.CLOSED)
+                    print("[Redis] Connection restored.")
+                    return True
+            for i, (name, call) in enumerate(ops):
+                try:
+                    getattr(RedisManager, name).__wrapped__(self, **call)
+                    write_buffer_ops.inc(labels={"outcome": "replayed"})
+                except CONNECTIVITY_ERRORS as e:
+                    print(f"[Redis] Replay interrupted after {i} writes: {e}")
+                    self.write_buffer.requeue(ops[i:])
+                    self.breaker.transition(CircuitBreaker.OPEN)
+                    return False
+                except Exception as e:
+                    print(f"[Redis] Dropping buffered {name} that failed on replay: {e}")
+                    write_buffer_ops.inc(labels={"outcome": "failed"})
+
+    def _degraded(self, func, signature: inspect.Signature, args, kwargs):
+        """Answers a call without Redis: buffers cart/session writes, serves carts from memory."""
+        name = func.__name__
+        fast_failures.inc(labels={"op": name})
+        if name in BUFFERED_WRITES:
+            call = signature.bind(self, *args, **kwargs).arguments
+            call.pop("self")
+            with self.write_buffer.lock:
+                # Re-checked under the lock: a replay may have just finished
+                if not self.breaker.allow():
+                    return True if self.write_buffer.record(name, call) else _failure_default(name)
+            return getattr(self, name)(*args, **kwargs)
+        if name == "get_cart":
+            session_id = signature.bind(self, *args, **kwargs).arguments["session_id"]
+            return self.write_buffer.cart(session_id)
+        return _failure_default(name)
+
     def check_connection(func):
-        """Decorator to check Redis connection before executing a method."""
+        """Decorator to check Redis connection before executing a method.
+
+        Connection errors and timeouts feed the circuit breaker; while it is not closed,
+        calls are answered by `_degraded` without waiting on Redis.
+        """
+        signature = inspect.signature(func)
+
         @wraps(func)
         def wrapper(self, *args, **kwargs):
             if not self.redis:
                 print(f"Redis connection not available for {func.__name__}")
                 # Return sensible defaults on connection failure
-                if "get_cart" in func.__name__: return {}
-                if "get_order" in func.__name__: return None # Although get_order isn't directly used by kept tools now
-                return False # Default fail for actions
+                return _failure_default(func.__name__)
+            if not self.breaker.allow():
+                return self._degraded(func, signature, args, kwargs)
             try:
-                return func(self, *args, **kwargs)
-            except (ConnectionError, RedisError) as e:
+                result = func(self, *args, **kwargs)
+            except CONNECTIVITY_ERRORS as e:
+                print(f"Redis connection error during {func.__name__}: {e}")
+                self.breaker.record_failure()
+                if not self.breaker.allow():
+                    return self._degraded(func, signature, args, kwargs)
+                return _failure_default(func.__name__)
+            except RedisError as e:
                 print(f"Redis Error during {func.__name__}: {e}")
-                if "get_cart" in func.__name__: return {}
-                if "get_order" in func.__name__: return None
-                return False
+                return _failure_default(func.__name__)
             except Exception as e:
                 print(f"Unexpected Error during Redis op {func.__name__}: {e}")
-                if "get_cart" in func.__name__: return {}
-                if "get_order" in func.__name__: return None
-                return False
+                return _failure_default(func.__name__)
+            self.breaker.record_success()
+            if func.__name__ in ("get_cart", "add_to_cart", "clear_cart"):
+                self.write_buffer.remember(func.__name__, signature.bind(self, *args, **kwargs).arguments, result)
+            return result
         return wrapper
 
     # --- Session Management (Optional but potentially useful) ---
@@ -75,6 +351,17 @@ class RedisManager:
         self.redis.expire(key, timedelta(days=7))
         return True
 
+    @check_connection
+    def touch_sessions(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Writes a batch of session field updates (e.g. last_active) in one pipelined round trip."""
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id, fields in updates.items():
+            key = f"session:{session_id}"
+            pipe.hset(key, mapping=self._serialize_dict_values(fields))
+            pipe.expire(key, timedelta(days=7))
+        pipe.execute()
+        return True
+
     @check_connection
     def get_session(self, session_id: str) -> Optional[Dict]:
         key = f"session:{session_id}"
@@ -129,10 +416,238 @@ class RedisManager:
             "items": json.dumps(items_dict_to_store), # Store final cart items as JSON string
             "created_at": order_data.get("created_at", datetime.now().isoformat())
         }
-        self.redis.hset(key, mapping=data_to_store)
+        try:
+            created_score = datetime.fromisoformat(data_to_store["created_at"]).timestamp()
+        except (TypeError, ValueError):
+            created_score = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(key, mapping=data_to_store)
         # Set expiry for this finalized record (maybe longer than active cart?)
-        self.redis.expire(key, timedelta(days=14)) # Example: 2 weeks
+        pipe.expire(key, ORDER_TTL) # Example: 2 weeks
+        # Time index for exports; entries older than the order TTL point at expired records
+        pipe.zadd(ORDERS_BY_CREATED_KEY, {session_id: created_score})
+        pipe.zremrangebyscore(ORDERS_BY_CREATED_KEY, "-inf", f"({time.time() - ORDER_TTL.total_seconds()}")
+        pipe.execute()
         return True # Assume success
 
+    @check_connection
+    def get_order(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieves the finalized order record for the session, parsing its items JSON."""
+        key = f"order:{session_id}"
+        raw_order = self.redis.hgetall(key)
+        if not raw_order:
+            return None
+        try:
+            raw_order["items"] = json.loads(raw_order.get("items") or "{}")
+        except (json.JSONDecodeError, TypeError) as parse_error:
+            print(f"[RedisManager Warning] Parsing items failed for order {key}: {parse_error}")
+            raw_order["items"] = {}
+        return raw_order
+
+    # --- Exports (see export.py) ---
+    @check_connection
+    def scan_hashes(self, match: str, cursor: int, count: int) -> Optional[Tuple[int, List[Tuple[str, Dict[str, str]]]]]:
+        """One SCAN step plus a pipelined HGETALL of the keys it returned; keys that aren't hashes are skipped."""
+        next_cursor, keys = self.redis.scan(cursor=cursor, match=match, count=count)
+        values = self.get_hashes.__wrapped__(self, keys) if keys else []
+        return int(next_cursor), [(key, value) for key, value in zip(keys, values) if value]
+
+    @check_connection
+    def get_hashes(self, keys: List[str]) -> Optional[List[Dict[str, str]]]:
+        """Pipelined HGETALL; an empty dict for missing keys and keys of another type."""
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [value if isinstance(value, dict) else {} for value in pipe.execute(raise_on_error=False)]
+
+    @check_connection
+    def orders_created_between(self, after: float, until: float, count: int,
+                               skip: Optional[int] = None) -> Optional[List[Tuple[str, float]]]:
+        """(session_id, created) of orders created in (after, until], oldest first, at most `count`.
+
+        With `skip`, the range includes `after` and passes over the first `skip` orders created
+        exactly then (equal scores are ordered by member), so paging can resume inside a run of
+        orders sharing one timestamp.
+        """
+        low = f"({after}" if skip is None else after
+        return self.redis.zrangebyscore(ORDERS_BY_CREATED_KEY, low, until, start=skip or 0, num=count, withscores=True)
+
+    # --- Resumable SSE buffers (Redis Streams) ---
+    @check_connection
+    def append_stream_events(self, session_id: str, events: List[Dict[str, str]], maxlen: int, ttl_seconds: int) -> bool:
+        """Appends buffered SSE events (each with 'id', 'turn' and 'data') to the session's bounded stream."""
+        key = f"sse:{session_id}"
+        pipe = self.redis.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(key, {"turn": event["turn"], "data": event["data"]}, id=event["id"], maxlen=maxlen, approximate=True)
+        pipe.expire(key, ttl_seconds)
+        pipe.execute()
+        return True
+
+    async def read_stream_events(self, session_id: str, after_id: str, block_ms: Optional[int] = None, inclusive: bool = False) -> List[tuple]:
+        """Returns (event_id, fields) entries after `after_id`; blocks up to `block_ms` for new ones if given.
+
+        Uses the asyncio client so many followers can wait on Redis without tying up threads.
+        """
+        key = f"sse:{session_id}"
+        if not self.breaker.allow():
+            fast_failures.inc(labels={"op": "read_stream_events"})
+            if block_ms:
+                await asyncio.sleep(block_ms / 1000)  # keep followers from spinning while Redis is down
+            return []
+        try:
+            if block_ms is None:
+                return await self.async_redis.xrange(key, min=after_id if inclusive else f"({after_id}", max="+")
+            result = await self.async_redis.xread({key: after_id}, block=block_ms)
+            return result[0][1] if result else []
+        except CONNECTIVITY_ERRORS as e:
+            print(f"Redis connection error during read_stream_events: {e}")
+            self.breaker.record_failure()
+            return []
+        except RedisError as e:
+            print(f"Redis Error during read_stream_events: {e}")
+            return []
+
+    # --- Chat job queue (Redis Streams consumer groups, used in queue execution mode) ---
+    @check_connection
+    def enqueue_chat_job(self, stream_key: str, job: Dict[str, str]) -> Optional[str]:
+        """Appends a chat turn job to a shard stream and returns its entry id."""
+        return self.redis.xadd(stream_key, job)
+
+    @check_connection
+    def allocate_turn_id(self, session_id: str, now_ms: int, ttl_seconds: int) -> int:
+        """Returns a turn id for the session's SSE stream: at least `now_ms`, above every id handed out before.
+
+        Allocated atomically in Redis, so API pods enqueueing in the same millisecond or with
+        skewed clocks never produce an id that sorts below the stream's last entry.
+        """
+        script = (
+            "local last = tonumber(redis.call('get', KEYS[1]) or '0') "
+            "local entry = redis.call('xrevrange', KEYS[2], '+', '-', 'COUNT', 1)[1] "
+            "if entry then last = math.max(last, tonumber(string.match(entry[1], '^(%d+)'))) end "
+            "local turn = math.max(tonumber(ARGV[1]), last + 1) "
+            "redis.call('set', KEYS[1], turn, 'EX', ARGV[2]) "
+            "return turn"
+        )
+        return int(self.redis.eval(script, 2, f"sse:{session_id}:turn", f"sse:{session_id}", now_ms, ttl_seconds))
+
+    @check_connection
+    def get_stream_length(self, stream_key: str) -> int:
+        return self.redis.xlen(stream_key)
+
+    @check_connection
+    def ensure_consumer_group(self, stream_key: str, group: str) -> bool:
+        try:
+            self.redis.xgroup_create(stream_key, group, id="0", mkstream=True)
+        except RedisError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        return True
+
+    @check_connection
+    def read_chat_jobs(self, streams: Dict[str, str], group: str, consumer: str, count: int, block_ms: int) -> List:
+        """XREADGROUP over the given {stream_key: id} map; id '>' for new jobs, '0' for our pending ones."""
+        return self.redis.xreadgroup(group, consumer, streams, count=count, block=block_ms) or []
+
+    @check_connection
+    def claim_chat_jobs(self, stream_key: str, group: str, consumer: str, count: int) -> List[Tuple[str, Optional[Dict[str, str]]]]:
+        """Moves every pending job on the stream to `consumer`, whichever consumer name held it.
+
+        XAUTOCLAIM with no idle threshold; returns (job_id, fields), fields empty for entries
+        deleted while pending (Redis < 7 returns them, later versions drop them from the PEL).
+        """
+        claimed: List[Tuple[str, Optional[Dict[str, str]]]] = []
+        start = "0-0"
+        while len(claimed) < count:
+            result = self.redis.xautoclaim(stream_key, group, consumer, min_idle_time=0, start_id=start, count=count - len(claimed))
+            start, entries = result[0], result[1]
+            claimed.extend(entries)
+            if start in ("0-0", b"0-0"):
+                break
+        return claimed
+
+    @check_connection
+    def ack_chat_job(self, stream_key: str, group: str, job_id: str) -> bool:
+        """Acknowledges and deletes a finished job so the stream length reflects outstanding work."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(stream_key, group, job_id)
+        pipe.xdel(stream_key, job_id)
+        pipe.execute()
+        return True
+
+    # --- Distributed locks ---
+    @check_connection
+    def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """SET NX PX lock; True if acquired, False if held by someone else."""
+        return bool(self.redis.set(key, token, nx=True, px=ttl_ms))
+
+    @check_connection
+    def extend_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        """Resets the lock's TTL if we own it, or re-takes it if it expired; False if someone else holds it."""
+        script = (
+            "local owner = redis.call('get', KEYS[1]) "
+            "if owner == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end "
+            "if not owner then redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2]) return 1 end "
+            "return 0"
+        )
+        return bool(self.redis.eval(script, 1, key, token, ttl_ms))
+
+    @check_connection
+    def release_lock(self, key: str, token: str) -> bool:
+        """Deletes the lock only if we still own it."""
+        script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+        return bool(self.redis.eval(script, 1, key, token))
+
+    # --- Model/part compatibility sets (see compatibility.py) ---
+    # Sets are scoped to a load generation (compat:<gen>:model:<model>, compat:<gen>:part:<part>);
+    # compat:generation names the current one, so a reload switches every set at once.
+    @check_connection
+    def check_compatibility(self, model: str, part: str) -> Optional[Dict[str, bool]]:
+        """SISMEMBER against the current generation's model set; None if the sets were never loaded."""
+        script = (
+            "local gen = redis.call('get', KEYS[1]) "
+            "if not gen then return nil end "
+            "local model_key = 'compat:' .. gen .. ':model:' .. ARGV[1] "
+            "return {redis.call('sismember', model_key, ARGV[2]), redis.call('exists', model_key), "
+            "redis.call('exists', 'compat:' .. gen .. ':part:' .. ARGV[2])}"
+        )
+        result = self.redis.eval(script, 1, "compat:generation", model, part)
+        if result is None:
+            return None
+        compatible, model_known, part_known = result
+        return {"model_known": bool(model_known), "part_known": bool(part_known), "compatible": bool(compatible)}
+
+    @check_connection
+    def load_compatibility(self, pairs, generation: int, batch_size: int = 5000) -> int:
+        """Loads (model, part) pairs as `generation` in pipelined batches, makes it current, then drops the others."""
+        prefix = f"compat:{generation}:"
+        if self.redis.get("compat:generation") != str(generation):
+            # Leftovers of an interrupted load of this generation
+            self._unlink_matching(f"{prefix}*", lambda key: True, batch_size)
+        loaded = 0
+        pipe = self.redis.pipeline(transaction=False)
+        for model, part in pairs:
+            pipe.sadd(f"{prefix}model:{model}", part)
+            pipe.sadd(f"{prefix}part:{part}", model)
+            loaded += 1
+            if loaded % batch_size == 0:
+                pipe.execute()
+        pipe.set("compat:generation", generation)
+        pipe.execute()
+        # Readers now use the new sets; earlier generations (and the pre-generation layout) go
+        self._unlink_matching("compat:*", lambda key: not key.startswith(prefix) and key != "compat:generation", batch_size)
+        return loaded
+
+    def _unlink_matching(self, pattern: str, predicate, batch_size: int) -> None:
+        stale = []
+        for key in self.redis.scan_iter(match=pattern, count=batch_size):
+            if predicate(key):
+                stale.append(key)
+            if len(stale) >= batch_size:
+                self.redis.unlink(*stale)
+                stale = []
+        if stale:
+            self.redis.unlink(*stale)
+
 # Instantiate Manager
-redis_manager = RedisManager()
\ No newline at end of file
+redis_manager = RedisManager()
@@ -0,0 +1,308 @@
+"""Offline BM25 index over refrigerator/dishwasher repair guides.
+
+Guides are Markdown files in REPAIR_CORPUS_DIR: a `# Symptom` title, an `appliance:` line and
+one `## Step` section per chunk, each optionally ending in a `Parts:` line. The index is a
+term-major CSR matrix saved as .npy files and memory-mapped at query time, so a search is a
+few numpy slices and no GPU or embedding model is needed.
+
+    uv run python repair_index.py build            # incremental: only changed guides are re-parsed
+    uv run python repair_index.py build --full
+    uv run python repair_index.py search "dishwasher not draining"
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+REPAIR_CORPUS_DIR = os.getenv("REPAIR_CORPUS_DIR", os.path.join(_HERE, "data", "repair_guides"))
+REPAIR_INDEX_DIR = os.getenv("REPAIR_INDEX_DIR", os.path.join(_HERE, "data", "repair_index"))
+REPAIR_INDEX_TOP_K = int(os.getenv("REPAIR_INDEX_TOP_K", "3"))
+# Build the index on first use when none exists yet (the Docker image builds it ahead of time)
+REPAIR_INDEX_AUTOBUILD = os.getenv("REPAIR_INDEX_AUTOBUILD", "True") == "True"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+APPLIANCES = ("refrigerator", "dishwasher")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PS_NUMBER = re.compile(r"\bPS\d{5,}\b", re.IGNORECASE)
+_STEP = re.compile(r"^\s*(?:\d+[.)]|[-*])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in is it its my not of on or "
+    "so that the their then there these this to up was what when where which while why will with you your".split()
+)
+# Symptoms like "not cooling" match on the verb; "not" itself is a stopword
+_SYNONYMS = {"fridge": "refrigerator", "freezer": "refrigerator", "icemaker": "ice"}
+
+search_latency = metrics.histogram("repair_index_search_seconds", "Local repair-guide index query time.")
+search_results = metrics.counter("repair_index_searches_total", "Repair-guide searches by outcome (hit|miss|unavailable).")
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _TOKEN.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        tokens.append(_stem(_SYNONYMS.get(word, word)))
+    return tokens
+
+
+def parse_guide(text: str, source: str) -> List[Dict[str, Any]]:
+    """Splits one guide into chunks, one per `##` section."""
+    title, appliance = "", ""
+    chunks: List[Dict[str, Any]] = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("## "):
+            chunks.append({"title": title, "appliance": appliance, "section": stripped[3:].strip(),
+                           "steps": [], "parts": [], "source": source})
+        elif stripped.startswith("# "):
+            title = stripped[2:].strip()
+        elif stripped.lower().startswith("appliance:"):
+            appliance = stripped.split(":", 1)[1].strip().lower()
+        elif chunks and stripped.lower().startswith("parts:"):
+            chunks[-1]["parts"] = [p.strip() for p in stripped.split(":", 1)[1].split(",") if p.strip()]
+        elif chunks and stripped:
+            chunks[-1]["steps"].append(_STEP.sub("", stripped))
+
+    for chunk in chunks:
+        chunk["part_numbers"] = sorted({m.upper() for m in _PS_NUMBER.findall(" ".join(chunk["steps"] + chunk["parts"]))})
+        # The symptom title is repeated so it outweighs incidental words in the steps
+        body = " ".join([chunk["title"], chunk["title"], chunk["section"], *chunk["steps"], *chunk["parts"]])
+        chunk["terms"] = dict(Counter(tokenize(body)))
+    return chunks
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def _read_manifest(index_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_index(corpus_dir: str = REPAIR_CORPUS_DIR, index_dir: str = REPAIR_INDEX_DIR, full: bool = False) -> Dict[str, Any]:
+    """(Re)builds the index; unless `full`, guides whose content hash is unchanged are not re-parsed.
+
+    Each build writes a new `gen-<n>` directory and then swaps `manifest.json` atomically,
+    so running servers keep reading the old generation until they notice the new one.
+    """
+    current = _read_manifest(index_dir)
+    previous = None if full else current
+    previous_files = previous["files"] if previous else {}
+
+    files: Dict[str, Dict[str, Any]] = {}
+    parsed = 0
+    for root, _dirs, names in os.walk(corpus_dir):
+        for name in sorted(names):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.join(root, name)
+            source = os.path.relpath(path, corpus_dir)
+            digest = _file_hash(path)
+            cached = previous_files.get(source)
+            if cached and cached["hash"] == digest:
+                files[source] = cached
+                continue
+            with open(path, encoding="utf-8") as f:
+                files[source] = {"hash": digest, "chunks": parse_guide(f.read(), source)}
+            parsed += 1
+
+    removed = len(set(previous_files) - set(files))
+    stats = {"files": len(files), "parsed": parsed, "removed": removed}
+    if previous and not parsed and not removed:
+        print(f"[RepairIndex] Index is up to date ({len(files)} guides).")
+        return {**stats, "generation": previous["generation"], "chunks": previous["chunks"]}
+
+    chunks = [chunk for source in sorted(files) for chunk in files[source]["chunks"]]
+    vocab = sorted({term for chunk in chunks for term in chunk["terms"]})
+    term_ids = {term: i for i, term in enumerate(vocab)}
+
+    # Term-major CSR: postings[indptr[t]:indptr[t + 1]] are the chunks containing term t
+    triples = [(term_ids[term], chunk_id, tf) for chunk_id, chunk in enumerate(chunks) for term, tf in chunk["terms"].items()]
+    triples.sort()
+    term_col = np.fromiter((t for t, _, _ in triples), dtype=np.int64, count=len(triples))
+    postings = np.fromiter((c for _, c, _ in triples), dtype=np.int32, count=len(triples))
+    tfs = np.fromiter((tf for _, _, tf in triples), dtype=np.float32, count=len(triples))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_col, minlength=len(vocab)), out=indptr[1:])
+
+    doc_len = np.array([sum(chunk["terms"].values()) for chunk in chunks], dtype=np.float32)
+    df = np.diff(indptr).astype(np.float32)
+    idf = np.log1p((len(chunks) - df + 0.5) / (df + 0.5)).astype(np.float32)
+    appliance = np.array([APPLIANCES.index(c["appliance"]) if c["appliance"] in APPLIANCES else -1 for c in chunks],
+                         dtype=np.int8)
+
+    generation = (current["generation"] + 1) if current else int(time.time())
+    gen_dir = os.path.join(index_dir, f"gen-{generation}")
+    os.makedirs(gen_dir, exist_ok=True)
+    for name, array in (("indptr", indptr), ("postings", postings), ("tfs", tfs), ("doc_len", doc_len),
+                        ("idf", idf), ("appliance", appliance)):
+        np.save(os.path.join(gen_dir, f"{name}.npy"), array)
+    with open(os.path.join(gen_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(gen_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump([{k: v for k, v in chunk.items() if k != "terms"} for chunk in chunks], f)
+
+    manifest = {
+        "generation": generation,
+        "built_at": time.time(),
+        "chunks": len(chunks),
+        "avg_doc_len": float(doc_len.mean()) if len(chunks) else 0.0,
+        "files": files,
+    }
+    tmp_path = os.path.join(index_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(index_dir, "manifest.json"))
+
+    # Keep the previous generation too: a process may have read the old manifest without opening its
+    # files yet. Older ones can go; processes that still map them keep their open file handles
+    keep = {f"gen-{generation}"} | ({f"gen-{current['generation']}"} if current else set())
+    for name in os.listdir(index_dir):
+        if name.startswith("gen-") and name not in keep:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+    print(f"[RepairIndex] Built generation {generation}: {len(chunks)} chunks, {len(vocab)} terms "
+          f"({parsed} guides parsed, {len(files) - parsed} reused, {removed} removed).")
+    return {**stats, "generation": generation, "chunks": len(chunks)}
+
+
+class RepairGuideIndex:
+    """A loaded, memory-mapped index generation."""
+
+    def __init__(self, index_dir: str, manifest: Dict[str, Any]):
+        gen_dir = os.path.join(index_dir, f"gen-{manifest['generation']}")
+        self.generation = manifest["generation"]
+        self.avg_doc_len = manifest["avg_doc_len"] or 1.0
+        self.indptr = np.load(os.path.join(gen_dir, "indptr.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(gen_dir, "postings.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(gen_dir, "tfs.npy"), mmap_mode="r")
+        self.doc_len = np.load(os.path.join(gen_dir, "doc_len.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(gen_dir, "idf.npy"), mmap_mode="r")
+        self.appliance = np.load(os.path.join(gen_dir, "appliance.npy"), mmap_mode="r")
+        with open(os.path.join(gen_dir, "vocab.json"), encoding="utf-8") as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(gen_dir, "chunks.json"), encoding="utf-8") as f:
+            self.chunks = json.load(f)
+
+    def search(self, query: str, k: int = REPAIR_INDEX_TOP_K, appliance: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top-k chunks by BM25 score, optionally restricted to one appliance."""
+        term_ids = {self.term_ids[t] for t in tokenize(query) if t in self.term_ids}
+        if not term_ids or not self.chunks:
+            return []
+
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.doc_len) / self.avg_doc_len)
+        for t in term_ids:
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs = self.postings[lo:hi]
+            tf = self.tfs[lo:hi]
+            # A chunk appears at most once per term, so plain fancy-index accumulation is safe
+            scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+
+        if appliance in APPLIANCES:
+            scores[np.asarray(self.appliance) != APPLIANCES.index(appliance)] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{**self.chunks[i], "score": round(float(scores[i]), 3)} for i in top if scores[i] > 0]
+
+
+_index: Optional[RepairGuideIndex] = None
+_index_mtime = 0
+_index_lock = threading.Lock()
+
+
+def get_repair_index() -> Optional[RepairGuideIndex]:
+    """The current index generation, reloaded when `manifest.json` changes; None if unavailable."""
+    global _index, _index_mtime
+    manifest_path = os.path.join(REPAIR_INDEX_DIR, "manifest.json")
+    with _index_lock:
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except OSError:
+            if not (REPAIR_INDEX_AUTOBUILD and os.path.isdir(REPAIR_CORPUS_DIR)):
+                return None
+            try:
+                build_index()
+                mtime = os.stat(manifest_path).st_mtime_ns
+            except Exception as e:
+                print(f"[RepairIndex] Could not build index: {e}")
+                return None
+
+        if _index is None or mtime != _index_mtime:
+            manifest = _read_manifest(REPAIR_INDEX_DIR)
+            if manifest is None:
+                return _index
+            _index = RepairGuideIndex(REPAIR_INDEX_DIR, manifest)
+            _index_mtime = mtime
+            print(f"[RepairIndex] Loaded generation {_index.generation} ({len(_index.chunks)} chunks).")
+        return _index
+
+
+def search_guides(query: str, k: int = REPAIR_INDEX_TOP_K, appliance: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """Searches the current index; None when no index is available."""
+    started = time.perf_counter()
+    index = get_repair_index()
+    if index is None:
+        search_results.inc(labels={"outcome": "unavailable"})
+        return None
+    results = index.search(query, k=k, appliance=appliance)
+    search_latency.observe(time.perf_counter() - started)
+    search_results.inc(labels={"outcome": "hit" if results else "miss"})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query the local repair-guide index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build")
+    build.add_argument("--corpus", default=REPAIR_CORPUS_DIR)
+    build.add_argument("--index", default=REPAIR_INDEX_DIR)
+    build.add_argument("--full", action="store_true", help="Re-parse every guide instead of only changed ones")
+    search = commands.add_parser("search")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=REPAIR_INDEX_TOP_K)
+    search.add_argument("--appliance", choices=APPLIANCES)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        os.makedirs(args.index, exist_ok=True)
+        print(json.dumps(build_index(args.corpus, args.index, full=args.full)))
+        return
+
+    started = time.perf_counter()
+    results = search_guides(args.query, k=args.k, appliance=args.appliance)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for result in results or []:
+        print(f"{result['score']:>7.3f}  {result['title']} / {result['section']}  [{', '.join(result['parts'])}]")
+    print(f"({len(results or [])} results in {elapsed_ms:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
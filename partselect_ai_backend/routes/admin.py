@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+from routes.auth import require_admin_token
+
+admin_router = APIRouter()
+
+
+@admin_router.get("/admin/export")
+def admin_export(
+    types: str = "session,cart,order",
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Streams sessions, carts and orders as gzip NDJSON (see export.py); resume with the last `cursor` line."""
+    require_admin_token(authorization)
+    import export
+
+    kinds = tuple(kind.strip() for kind in types.split(",") if kind.strip())
+    unknown = set(kinds) - set(export.EXPORT_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(sorted(unknown))}")
+    try:
+        if cursor:
+            export.parse_cursor(cursor, kinds)
+        since_ts = export.parse_since(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"export-{datetime.now().strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+    # A sync generator: Starlette iterates it in a worker thread, so pacing sleeps don't block the loop
+    return StreamingResponse(
+        export.iter_gzip(export.iter_export(kinds, resume=cursor, since=since_ts)),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,58 @@
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+import fastjson
+from routes.auth import require_admin_token
+
+batch_router = APIRouter()
+
+
+async def _lines(body: bytes) -> AsyncIterator[str]:
+    for line in body.splitlines():
+        yield line.decode("utf-8", errors="replace")
+
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    """The request body, or 413 as soon as it exceeds `limit` bytes (checked while reading, not after)."""
+    too_large = HTTPException(status_code=413, detail=f"Batch body exceeds {limit} bytes; split the input")
+    try:
+        if int(request.headers.get("content-length") or 0) > limit:
+            raise too_large
+    except ValueError:
+        pass
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@batch_router.post("/batch/answers")
+async def batch_answers(
+    request: Request,
+    concurrency: Optional[int] = Query(None, gt=0),
+    timeout: Optional[float] = Query(None, gt=0),
+    authorization: Optional[str] = Header(None),
+):
+    """Answers NDJSON questions (one `{"id", "message"}` per line) and streams NDJSON results plus a summary line."""
+    require_admin_token(authorization)
+    # The agent stack loads on first use, not at startup
+    import batch
+
+    # Read up front: while the response streams, the server listens on the same channel for
+    # disconnects. The body is therefore held in memory, capped at BATCH_MAX_BODY_BYTES.
+    body = await _read_body(request, batch.BATCH_MAX_BODY_BYTES)
+
+    async def results() -> AsyncIterator[str]:
+        async for record in batch.run_batch(
+            _lines(body),
+            concurrency=batch.BATCH_CONCURRENCY if concurrency is None else concurrency,
+            timeout=batch.BATCH_ITEM_TIMEOUT if timeout is None else timeout,
+        ):
+            yield fastjson.dumps(record) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+catalog_router = APIRouter()
+
+# Compatibility data only changes when the index is rebuilt
+CATALOG_CACHE_SECONDS = int(os.getenv("CATALOG_CACHE_SECONDS", "300"))
+
+
+def _compat():
+    # numpy-backed; loaded on first lookup so it stays off the startup path
+    import compatibility
+    return compatibility
+
+
+def _cache_headers() -> dict:
+    return {"Cache-Control": f"public, max-age={CATALOG_CACHE_SECONDS}"}
+
+
+@catalog_router.get("/compatibility")
+def read_compatibility(model: str, part: str):
+    """Checks whether a part is listed as compatible with a model, without an agent turn."""
+    result = _compat().check_compatibility(model, part)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Compatibility data is not available")
+    return JSONResponse(result, headers=_cache_headers())
+
+
+@catalog_router.get("/models/{model}/parts")
+def read_model_parts(model: str, limit: Optional[int] = None):
+    """Parts listed as compatible with a model (first `limit`, sorted by part number)."""
+    compat = _compat()
+    index = compat.get_compat_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Compatibility data is not available")
+    model = compat.normalize_model(model)
+    parts = index.parts_for_model(model, limit=limit or compat.COMPAT_LIST_LIMIT)
+    if parts is None:
+        raise HTTPException(status_code=404, detail="Model not found in catalog")
+    return JSONResponse({
+        "model_number": model,
+        "parts": [{"part_number": p, "part_name": index.part_names.get(p)} for p in parts],
+    }, headers=_cache_headers())
+
+
+@catalog_router.get("/parts/{part}/models")
+def read_part_models(part: str, limit: Optional[int] = None):
+    """Models a part is listed as compatible with (first `limit`, sorted by model number)."""
+    compat = _compat()
+    index = compat.get_compat_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Compatibility data is not available")
+    part = compat.normalize_part(part)
+    models = index.models_for_part(part, limit=limit or compat.COMPAT_LIST_LIMIT)
+    if models is None:
+        raise HTTPException(status_code=404, detail="Part not found in catalog")
+    return JSONResponse({"part_number": part, "part_name": index.part_names.get(part), "models": models},
+                        headers=_cache_headers())
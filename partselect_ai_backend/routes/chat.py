@@ -1,31 +1,21 @@
-from datetime import datetime
-import json
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from uuid import uuid4, UUID 
-from langchain_core.messages import HumanMessage
-from typing import List, Optional, AsyncGenerator, Dict, Any
-from agents.agent import build_agent_for_session
-from langchain_core.callbacks.base import AsyncCallbackHandler
-import asyncio
-from redis_manager import redis_manager 
+from typing import List, Optional, AsyncGenerator
+from concurrency import TurnRejectedError
+from chat_queue import QueueFullError, enqueue_turn, queue_mode_enabled
+from session_activity import session_activity
+from stream_buffer import format_sse, parse_event_id, stream_buffer
 
 chat_router = APIRouter()
 
-# In-memory cache for agent instances (eviction strategy for production)
-session_memory_cache = {}
-
-class FastAPIStreamingHandler(AsyncCallbackHandler):
-    def __init__(self, prefix: str = "Handler"):
-        # self.queue = queue
-        self.prefix = prefix
 
-    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
-        print(f"[{self.prefix} Log] Tool Start: {serialized.get('name')}, Input: {input_str}")
-
-    async def on_tool_end(self, output: str, **kwargs: Any):
-        print(f"[{self.prefix} Log] Tool End: Output: {output[:100]}{'...' if len(output) > 100 else ''}") 
+def _runner():
+    # The agent stack (LangChain/LangGraph) loads on first use or during the /readyz warm-up, not at startup
+    from agents import runner
+    return runner
 
 
 class PartReference(BaseModel):
@@ -58,103 +48,81 @@ def is_off_topic(text: str) -> bool:
 
 
 @chat_router.get("/stream_chat")
-async def stream_chat(message: str, session_id: Optional[str] = None):
+async def stream_chat(
+    message: str,
+    session_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    # EventSource sends Last-Event-ID on automatic reconnects; clients may also pass it explicitly
+    resume_from = last_event_id_header or last_event_id
+    parsed_resume = parse_event_id(resume_from)
+    if parsed_resume and parsed_resume[0]:
+        # The event id names its session, so a first turn's reconnect (URL without session_id) resumes too
+        session_id = parsed_resume[0]
+
+    new_session = False
     if session_id:
         try:
             UUID(session_id, version=4)
         except ValueError:
             print(f"Invalid session_id format: {session_id}. Generating new one.")
-            session_id = str(uuid4())
+            session_id, new_session = str(uuid4()), True
     else:
-        session_id = str(uuid4())
+        session_id, new_session = str(uuid4()), True
         print(f"No session_id provided. Generated new one: {session_id}")
 
-    try:
-        if session_id not in session_memory_cache:
-            print(f"Creating new agent for session: {session_id}")
-            handler = FastAPIStreamingHandler(prefix=f"Agent-{session_id[:4]}")
-
-            app, memory = build_agent_for_session( 
-                session_id,
-                callback_handler=handler 
-            )
-
-            # Store the compiled app and memory in cache
-            session_memory_cache[session_id] = {
-                "app": app, 
-                "memory": memory,
-                "handler": handler
-            }
-            print(f"Agent and memory cached for session: {session_id}")
-
-            redis_update_success = redis_manager.update_session(session_id, {
-                "agent_initialized": True,
-                "created_at": datetime.now().isoformat(),
-            })
-            if not redis_update_success:
-                print(f"Warning: Failed initial Redis update for session {session_id}")
+    if resume_from:
+        print(f"[Stream] Client reconnected for session {session_id} with Last-Event-ID {resume_from}.")
+        return StreamingResponse(stream_buffer.resume(session_id, resume_from), media_type="text/event-stream")
 
+    try:
+        if queue_mode_enabled():
+            # A worker process runs the turn; this pod only relays its events from Redis
+            if new_session:
+                # Written now rather than debounced, so the session is readable while its first turn streams
+                await asyncio.to_thread(session_activity.create, session_id)
+            else:
+                session_activity.touch(session_id)
+            try:
+                # Sync Redis round trips; keep them off the event loop
+                queued = await asyncio.to_thread(enqueue_turn, session_id, message)
+            except QueueFullError as qe:
+                print(f"[Queue] Rejecting turn for session {session_id}: {qe}")
+                raise HTTPException(status_code=503, detail="Chat service is busy, please retry shortly.", headers={"Retry-After": "2"})
+            if not queued:
+                raise ConnectionError("Could not enqueue chat turn")
+            job_id, turn_ms = queued
+            print(f"[Queue] Enqueued turn {turn_ms} for session {session_id} as job {job_id}.")
+            return StreamingResponse(stream_buffer.follow(session_id, turn_ms), media_type="text/event-stream")
+
+        _, created = _runner().get_or_create_session_agent(session_id)
+        if created:
+            # Written now rather than debounced, so the session is readable while its first turn streams
+            await _runner().record_new_session(session_id)
         else:
-            print(f"Reusing existing agent for session: {session_id}")
-            app = session_memory_cache[session_id]["app"]
-            handler = session_memory_cache[session_id]["handler"] 
+            # Buffered and flushed in batches, so returning sessions cost no Redis round trip here
+            session_activity.touch(session_id)
 
-            redis_update_success = redis_manager.update_session(session_id, {
-                 # No other fields needed, just updates last_active implicitly
-            })
-            if not redis_update_success:
-                 print(f"Warning: Failed Redis last_active update for session {session_id}")
+        # The agent runs in the background so a dropped client doesn't abandon the turn
+        try:
+            turn = _runner().start_turn_in_background(session_id, message)
+        except TurnRejectedError as tre:
+            print(f"[Admission] Rejecting turn for session {session_id}: {tre}")
+            raise HTTPException(status_code=429, detail="Too many requests, please retry shortly.", headers={"Retry-After": str(tre.retry_after)})
 
         async def event_stream() -> AsyncGenerator[str, None]:
-            """Streams events from the LangGraph app's astream_events method."""
-            print(f"[Stream] Starting event stream (astream_events) for session {session_id}...")
+            """Streams the turn's buffered events; each carries an SSE id usable for resuming."""
             try:
-                graph_input = {"messages": [HumanMessage(content=message)]}
-                config = {
-                    "configurable": {"thread_id": session_id},
-                    "recursion_limit": 15,
-                    "callbacks": [handler],
-                }
-
-                event_counter = 0
-                async for event in app.astream_events(graph_input, config=config, version="v2"):
-                    event_counter += 1
-                    kind = event["event"]
-                    name = event.get("name")
-                    tags = event.get("tags", [])
-
-                    if kind == "on_chat_model_stream":
-                     chunk_data = event.get("data", {}).get("chunk")
-                     if chunk_data and hasattr(chunk_data, 'content'):
-                        token = chunk_data.content
-                        if isinstance(token, str):
-                            # print(f"---> Backend Yielding Token (from event): '{token}'")
-                            event_data = json.dumps({
-                                "type": "token",
-                                "content": token, 
-                                "session_id": session_id
-                            })
-                            yield f"data: {event_data}\n\n"
-                       
-                print(f"[Stream] Completed successfully (astream_events loop finished) after {event_counter} events for session {session_id}.")
-                done_event = json.dumps({"type": "done", "session_id": session_id})
-                yield f"data: {done_event}\n\n"
-
+                async for event_id, data in turn.subscribe():
+                    yield format_sse(session_id, event_id, data)
             except asyncio.CancelledError:
-                 print(f"[Stream] Client disconnected for session {session_id}.")
-            except Exception as e:
-                print(f"[ERROR] Streaming failed for session {session_id}: {type(e).__name__} - {str(e)}")
-                print(traceback.format_exc())
-                error_event = json.dumps({
-                    "type": "error",
-                    "content": f"An error occurred during streaming: {str(e)}",
-                    "session_id": session_id
-                })
-                yield f"data: {error_event}\n\n"
-
+                print(f"[Stream] Client disconnected for session {session_id}; turn continues in background.")
 
         return StreamingResponse(event_stream(), media_type="text/event-stream")
 
+    except HTTPException:
+        raise
     except ConnectionError as ce:
          print(f"ERROR in /stream_chat (Redis Connection): {str(ce)}")
          raise HTTPException(status_code=503, detail=f"Service temporarily unavailable: {str(ce)}")
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from redis_manager import redis_manager
+
+health_router = APIRouter()
+
+# Start warming up as soon as the app starts, instead of on the first /readyz probe
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True") == "True"
+# Open a connection to the LLM API during warm-up so the first turn skips DNS/TCP/TLS
+WARMUP_LLM_CONNECTION = os.getenv("WARMUP_LLM_CONNECTION", "True") == "True"
+
+_warmup_task: Optional[asyncio.Task] = None
+_warmup_report: Dict[str, Any] = {"ready": False, "steps": {}}
+
+
+def _load_agent_stack() -> None:
+    # LangChain, LangGraph and the model client are imported here rather than at startup
+    from agents.agent import build_agent_for_session
+    from agents import runner  # noqa: F401  (registers its metrics and stream modes)
+
+    # Compiling a throwaway graph primes the code paths every new session goes through
+    build_agent_for_session("warmup")
+
+
+async def _prime_llm_pool() -> None:
+    from agents.llm import get_async_http_client
+
+    client = get_async_http_client()
+    if not WARMUP_LLM_CONNECTION:
+        return
+    base_url = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1").rstrip("/")
+    headers = {"Authorization": f"Bearer {os.getenv('DEEPSEEK_API_KEY', '')}"}
+    # Any response means the pooled connection is open; the status itself doesn't matter
+    response = await client.get(f"{base_url}/models", headers=headers)
+    await response.aclose()
+
+
+async def _step(name: str, coro) -> bool:
+    started = time.perf_counter()
+    try:
+        ok = await coro
+        ok = True if ok is None else bool(ok)
+    except Exception as e:
+        print(f"[Warmup] {name} failed: {type(e).__name__} - {e}")
+        ok = False
+    _warmup_report["steps"][name] = {"ok": ok, "seconds": round(time.perf_counter() - started, 3)}
+    return ok
+
+
+async def warm_up() -> Dict[str, Any]:
+    """Loads the agent stack and opens the Redis and LLM pools before traffic arrives."""
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        _step("agent_graph", asyncio.to_thread(_load_agent_stack)),
+        _step("redis", asyncio.to_thread(redis_manager.ping)),
+        _step("redis_async", redis_manager.aping()),
+    )
+    # The LLM client lives in agents.llm, which the graph step has just imported
+    await _step("llm_pool", _prime_llm_pool())
+    # Only the agent graph is required; Redis and the LLM API being down is reported, not fatal
+    _warmup_report["ready"] = results[0]
+    _warmup_report["seconds"] = round(time.perf_counter() - started, 3)
+    print(f"[Warmup] Finished in {_warmup_report['seconds']}s (ready={_warmup_report['ready']}).")
+    return _warmup_report
+
+
+def start_warmup() -> asyncio.Task:
+    global _warmup_task
+    if _warmup_task is None or (_warmup_task.done() and not _warmup_report["ready"]):
+        _warmup_task = asyncio.create_task(warm_up())
+    return _warmup_task
+
+
+@health_router.get("/healthz")
+def liveness():
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz")
+async def readiness():
+    """Readiness: 200 once warm-up finished, 503 (and warm-up started if needed) before that."""
+    task = start_warmup()
+    if not task.done():
+        return JSONResponse({"status": "warming_up", **_warmup_report}, status_code=503)
+    status = 200 if _warmup_report["ready"] else 503
+    return JSONResponse({"status": "ready" if status == 200 else "not_ready", **_warmup_report}, status_code=status)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics import metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus text exposition of this process's metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,111 @@
+import hashlib
+import math
+import os
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+import fastjson
+from redis_manager import redis_manager
+
+session_router = APIRouter()
+
+# Short-lived in-process cache of serialized session reads: path -> (expires_at, body, etag).
+# Carts and orders are never cached: tools, WebSocket frames and queue workers in other
+# processes write them, and a read right after a write must see it.
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "2"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "10000"))
+_read_cache: Dict[str, Tuple[float, bytes, str]] = {}
+
+
+def make_etag(body: bytes) -> str:
+    """Weak ETag derived from the serialized response body."""
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def _cached_read(cache_key: str, loader: Callable[[], Any], ttl: float = READ_CACHE_TTL) -> Tuple[bytes, str]:
+    now = time.monotonic()
+    cached = _read_cache.get(cache_key) if ttl > 0 else None
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+
+    data = loader()
+    body = fastjson.dumps_bytes(data, sort_keys=True)
+    etag = make_etag(body)
+    if ttl > 0:
+        if len(_read_cache) >= READ_CACHE_MAX_ENTRIES:
+            # Drop expired entries first; fall back to clearing if still full
+            for key in [k for k, v in _read_cache.items() if v[0] <= now]:
+                _read_cache.pop(key, None)
+            if len(_read_cache) >= READ_CACHE_MAX_ENTRIES:
+                _read_cache.clear()
+        _read_cache[cache_key] = (now + ttl, body, etag)
+    return body, etag
+
+
+def _conditional_response(request: Request, body: bytes, etag: str, ttl: float = 0) -> Response:
+    # Rounded up, so a fractional TTL isn't advertised as max-age=0 while the server caches it
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={math.ceil(ttl)}" if ttl > 0 else "private, no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _require_redis(allow_degraded: bool = False) -> None:
+    """503 unless Redis is reachable; carts can also be served from the degraded in-memory view."""
+    if not redis_manager.redis or not (allow_degraded or redis_manager.available):
+        raise HTTPException(status_code=503, detail="Session store temporarily unavailable")
+
+
+@session_router.get("/cart/{session_id}")
+def read_cart(session_id: str, request: Request):
+    """Returns the session's cart straight from Redis, without an agent turn."""
+    _require_redis(allow_degraded=True)
+
+    def load() -> Dict[str, Any]:
+        items = redis_manager.get_cart(session_id)
+        return {
+            "session_id": session_id,
+            "items": items,
+            "item_count": sum(item.get("quantity", 0) for item in items.values()),
+        }
+
+    body, etag = _cached_read(f"/cart/{session_id}", load, ttl=0)
+    return _conditional_response(request, body, etag)
+
+
+@session_router.get("/session/{session_id}")
+def read_session(session_id: str, request: Request):
+    """Returns the session metadata hash (created_at, last_active, ...)."""
+    _require_redis()
+
+    def load() -> Dict[str, Any]:
+        session = redis_manager.get_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return {"session_id": session_id, **session}
+
+    body, etag = _cached_read(f"/session/{session_id}", load)
+    return _conditional_response(request, body, etag, READ_CACHE_TTL)
+
+
+@session_router.get("/order/{session_id}")
+def read_order(session_id: str, request: Request):
+    """Returns the finalized order record created by the Checkout tool."""
+    _require_redis()
+
+    def load() -> Dict[str, Any]:
+        order = redis_manager.get_order(session_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return {"session_id": session_id, **order}
+
+    body, etag = _cached_read(f"/order/{session_id}", load, ttl=0)
+    return _conditional_response(request, body, etag)
@@ -0,0 +1,230 @@
+"""WebSocket chat transport: one connection per session carrying many turns.
+
+Frames are compact JSON arrays whose first element is an opcode. `ref` is chosen by the
+client for each request and echoed on every frame that answers it.
+
+Client -> server:
+    ["m", ref, message]                     start a turn
+    ["c", ref]                              cancel turn `ref`
+    ["k", ref]                              read the cart
+    ["a", ref, part_number, quantity, name] add or update a cart item
+    ["z", ref]                              clear the cart
+
+Server -> client:
+    ["s", session_id]                       session resolved (first frame)
+    ["t", ref, text]                        token of turn `ref`
+    ["d", ref]                              turn finished
+    ["x", ref]                              turn cancelled
+    ["e", ref, message]                     error (ref is null for malformed frames)
+    ["k", ref, cart]                        cart; ref is null when pushed because a turn changed it
+"""
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+import fastjson
+from chat_queue import QueueFullError, enqueue_turn, queue_mode_enabled
+from concurrency import TurnRejectedError
+from metrics import metrics
+from redis_manager import redis_manager
+from session_activity import session_activity
+from stream_buffer import stream_buffer
+
+ws_router = APIRouter()
+
+ws_connections = metrics.gauge("ws_connections", "Open chat WebSocket connections.")
+ws_turns = metrics.counter("ws_turns_total", "Turns started over WebSocket, by outcome.")
+
+
+def _runner():
+    from agents import runner
+    return runner
+
+
+def _resolve_session_id(session_id: Optional[str]) -> Tuple[str, bool]:
+    """The session to use and whether it was generated here (a new session)."""
+    if session_id:
+        try:
+            UUID(session_id, version=4)
+            return session_id, False
+        except ValueError:
+            print(f"[WS] Invalid session_id format: {session_id}. Generating new one.")
+    return str(uuid4()), True
+
+
+class ChatConnection:
+    """Per-connection state: the resolved session, running turns and the last cart sent."""
+
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.forwarders: Dict[Any, asyncio.Task] = {}
+        self.turn_tasks: Dict[Any, asyncio.Task] = {}
+        self.last_cart: Optional[Dict[str, Any]] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, *frame: Any) -> None:
+        # Turns stream concurrently; frames must not interleave on the socket
+        async with self._send_lock:
+            await self.websocket.send_text(fastjson.dumps(list(frame)))
+
+    async def start_turn(self, ref: Any, message: str) -> None:
+        if ref in self.forwarders:
+            await self.send("e", ref, "A turn with this ref is already running.")
+            return
+        session_activity.touch(self.session_id)
+        forwarder = asyncio.create_task(self._forward_turn(ref, message))
+        self.forwarders[ref] = forwarder
+        forwarder.add_done_callback(lambda _: self._forget(ref))
+
+    def _forget(self, ref: Any) -> None:
+        self.forwarders.pop(ref, None)
+        self.turn_tasks.pop(ref, None)
+
+    async def _forward_turn(self, ref: Any, message: str) -> None:
+        try:
+            await self._relay_turn(ref, message)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"[WS] Turn {ref!r} failed for session {self.session_id}: {type(e).__name__} - {e}")
+            await self.send("e", ref, "An error occurred while answering.")
+
+    async def _relay_turn(self, ref: Any, message: str) -> None:
+        if queue_mode_enabled():
+            try:
+                queued = await asyncio.to_thread(enqueue_turn, self.session_id, message)
+            except QueueFullError as qe:
+                print(f"[WS] Rejecting turn for session {self.session_id}: {qe}")
+                queued = None
+            if not queued:
+                ws_turns.inc(labels={"outcome": "rejected"})
+                await self.send("e", ref, "Chat service is busy, please retry shortly.")
+                return
+            _, turn_ms = queued
+            events = stream_buffer.follow_events(self.session_id, turn_ms)
+        else:
+            try:
+                turn = _runner().start_turn_in_background(self.session_id, message)
+            except TurnRejectedError as tre:
+                print(f"[WS] Rejecting turn for session {self.session_id}: {tre}")
+                ws_turns.inc(labels={"outcome": "rejected"})
+                await self.send("e", ref, "Too many requests, please retry shortly.")
+                return
+            self.turn_tasks[ref] = turn.task
+            events = turn.subscribe()
+
+        ws_turns.inc(labels={"outcome": "started"})
+        async for _event_id, data in events:
+            event = fastjson.loads(data)
+            kind = event.get("type")
+            if kind == "token":
+                await self.send("t", ref, event.get("content", ""))
+            elif kind == "done":
+                await self.send("d", ref)
+                await self.push_cart_if_changed()
+                return
+            elif kind == "error":
+                await self.send("e", ref, event.get("content", ""))
+                return
+
+    async def cancel_turn(self, ref: Any) -> None:
+        """Stops streaming turn `ref`; inline turns are cancelled, queued ones finish on their worker."""
+        forwarder = self.forwarders.get(ref)
+        if forwarder is None:
+            await self.send("e", ref, "No running turn with this ref.")
+            return
+        turn_task = self.turn_tasks.get(ref)
+        if turn_task is not None:
+            turn_task.cancel()
+        forwarder.cancel()
+        ws_turns.inc(labels={"outcome": "cancelled"})
+        await self.send("x", ref)
+
+    async def send_cart(self, ref: Any) -> None:
+        cart = await asyncio.to_thread(redis_manager.get_cart, self.session_id)
+        self.last_cart = cart
+        await self.send("k", ref, cart)
+
+    async def push_cart_if_changed(self) -> None:
+        cart = await asyncio.to_thread(redis_manager.get_cart, self.session_id)
+        if cart != self.last_cart:
+            self.last_cart = cart
+            await self.send("k", None, cart)
+
+    async def add_to_cart(self, ref: Any, part_number: Any, quantity: Any, name: Any) -> None:
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if not part_number or not name or quantity < 1:
+            await self.send("e", ref, "part_number, a positive quantity and name are required.")
+            return
+        if not await asyncio.to_thread(redis_manager.add_to_cart, self.session_id, str(part_number), quantity, str(name)):
+            await self.send("e", ref, "Cart storage is temporarily unavailable.")
+            return
+        await self.send_cart(ref)
+
+    async def clear_cart(self, ref: Any) -> None:
+        await asyncio.to_thread(redis_manager.clear_cart, self.session_id)
+        await self.send_cart(ref)
+
+    async def handle(self, raw: Optional[str]) -> None:
+        try:
+            frame = fastjson.loads(raw)
+        except (ValueError, TypeError):
+            frame = None  # not JSON, or not a text frame
+        # [op, ref, ...]; bool is an int subclass but never a valid ref
+        if (not isinstance(frame, list) or len(frame) < 2 or not isinstance(frame[1], (str, int))
+                or isinstance(frame[1], bool)):
+            await self.send("e", None, "Malformed frame.")
+            return
+        op, ref, *args = frame
+        if op == "m" and len(args) == 1 and isinstance(args[0], str):
+            await self.start_turn(ref, args[0])
+        elif op == "c":
+            await self.cancel_turn(ref)
+        elif op == "k":
+            await self.send_cart(ref)
+        elif op == "a" and len(args) == 3:
+            await self.add_to_cart(ref, *args)
+        elif op == "z":
+            await self.clear_cart(ref)
+        else:
+            await self.send("e", ref, f"Unknown or malformed op {op!r}.")
+
+    def close(self) -> None:
+        # Like a dropped SSE client: the turns keep running and stay resumable; only forwarding stops
+        for forwarder in list(self.forwarders.values()):
+            forwarder.cancel()
+
+
+@ws_router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, session_id: Optional[str] = None):
+    await websocket.accept()
+    # Resolved once: every turn on this connection reuses the session and its cached agent
+    session_id, new_session = _resolve_session_id(session_id)
+    if not queue_mode_enabled():
+        _, created = _runner().get_or_create_session_agent(session_id)
+        if created:
+            await _runner().record_new_session(session_id)
+    elif new_session:
+        await asyncio.to_thread(session_activity.create, session_id)
+    connection = ChatConnection(websocket, session_id)
+    ws_connections.inc()
+    print(f"[WS] Connection opened for session {session_id}.")
+    try:
+        await connection.send("s", session_id)
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+            # Binary frames carry no "text"; they are answered as malformed instead of closing the socket
+            await connection.handle(message.get("text"))
+    except WebSocketDisconnect:
+        print(f"[WS] Client disconnected for session {session_id}; running turns continue in background.")
+    finally:
+        connection.close()
+        ws_connections.dec()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+from redis_manager import redis_manager
+
+# Session activity (last_active and other small session fields) is written to Redis in
+# pipelined batches at most once per window, instead of an HSET + EXPIRE on every request
+SESSION_TOUCH_DEBOUNCE = float(os.getenv("SESSION_TOUCH_DEBOUNCE", "5"))
+# Flush early when this many sessions are waiting
+SESSION_TOUCH_MAX_PENDING = int(os.getenv("SESSION_TOUCH_MAX_PENDING", "10000"))
+
+touch_flushes = metrics.counter("session_touch_flushes_total", "Session activity batch flushes by outcome.")
+touch_flushed_sessions = metrics.counter("session_touch_sessions_flushed_total", "Sessions written by activity flushes.")
+
+
+class SessionActivityBuffer:
+    """Coalesces session updates in memory and flushes them on a timer, on size, and at shutdown."""
+
+    def __init__(self, debounce: float = SESSION_TOUCH_DEBOUNCE, max_pending: int = SESSION_TOUCH_MAX_PENDING):
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, session_id: str, fields: Optional[Dict[str, Any]] = None) -> None:
+        """Records activity (plus optional fields) for the next flush; no Redis round trip."""
+        entry = self._pending.setdefault(session_id, {})
+        entry.update(fields or {})
+        entry["last_active"] = datetime.now().isoformat()
+        if not self._ensure_started():
+            # No event loop to flush from (scripts, tests): write through
+            self._flush_sync()
+        elif len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def create(self, session_id: str, fields: Optional[Dict[str, Any]] = None) -> None:
+        """Writes a new session's record (created_at plus `fields`) right away, with one Redis round trip.
+
+        Only creation skips the debounce, so `GET /session/{id}` finds a session during its first
+        turn. If the write fails, the record is buffered like any other activity.
+        """
+        now = datetime.now().isoformat()
+        record = {**self._pending.pop(session_id, {}), "created_at": now, **(fields or {}), "last_active": now}
+        if not redis_manager.touch_sessions({session_id: record}):
+            self.touch(session_id, record)
+
+    def _ensure_started(self) -> bool:
+        if self._task is not None and not self._task.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _take(self) -> Dict[str, Dict[str, Any]]:
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _requeue(self, batch: Dict[str, Dict[str, Any]]) -> None:
+        # Newer touches recorded during the failed flush win over the batch's values
+        for session_id, fields in batch.items():
+            if len(self._pending) >= self.max_pending and session_id not in self._pending:
+                continue
+            self._pending[session_id] = {**fields, **self._pending.get(session_id, {})}
+
+    def _record(self, batch: Dict[str, Dict[str, Any]], ok: bool) -> None:
+        touch_flushes.inc(labels={"outcome": "ok" if ok else "failed"})
+        if ok:
+            touch_flushed_sessions.inc(len(batch))
+        else:
+            print(f"[SessionActivity] Flush of {len(batch)} sessions failed; retrying next window.")
+            self._requeue(batch)
+
+    async def flush(self) -> None:
+        batch = self._take()
+        if batch:
+            self._record(batch, await asyncio.to_thread(redis_manager.touch_sessions, batch))
+
+    def _flush_sync(self) -> None:
+        batch = self._take()
+        if batch:
+            self._record(batch, redis_manager.touch_sessions(batch))
+
+    async def stop(self) -> None:
+        """Stops the timer and writes whatever is still pending (called at shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+session_activity = SessionActivityBuffer()
+metrics.gauge("session_touch_pending", "Sessions with activity waiting to be flushed to Redis.", lambda: len(session_activity))
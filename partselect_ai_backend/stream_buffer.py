@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+import fastjson
+from redis_manager import redis_manager
+
+# Bounded per-session Redis stream holding the SSE events of recent turns
+STREAM_BUFFER_MAXLEN = int(os.getenv("STREAM_BUFFER_MAXLEN", "2000"))
+STREAM_BUFFER_TTL = int(os.getenv("STREAM_BUFFER_TTL", "900"))
+# How long a finished turn stays in process memory for fast local replay
+STREAM_LIVE_GRACE = float(os.getenv("STREAM_LIVE_GRACE", "60"))
+# How long a followed stream waits without new events from a turn running elsewhere before giving up
+STREAM_RESUME_TIMEOUT = float(os.getenv("STREAM_RESUME_TIMEOUT", "120"))
+
+TERMINAL_EVENT_TYPES = ("done", "error")
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[Optional[str], int, int]]:
+    """Parses an SSE id of the form '<session_id>.<turn_ms>-<seq>' into (session_id, turn_ms, seq).
+
+    The '<turn_ms>-<seq>' part is the Redis stream id; ids without the session prefix parse
+    with a session of None.
+    """
+    if not event_id:
+        return None
+    session_part, _, stream_part = event_id.strip().rpartition(".")
+    try:
+        turn_part, seq_part = stream_part.split("-", 1)
+        return session_part or None, int(turn_part), int(seq_part)
+    except ValueError:
+        return None
+
+
+def format_sse(session_id: str, event_id: str, data: str) -> str:
+    # The session travels in the id: a reconnect to a URL without session_id still resumes the right turn
+    return f"id: {session_id}.{event_id}\ndata: {data}\n\n"
+
+
+class TurnStream:
+    """In-process buffer of one streamed turn; its event ids increase monotonically."""
+
+    def __init__(self, session_id: str, turn_ms: int):
+        self.session_id = session_id
+        self.turn_id = str(turn_ms)
+        self.events: List[Tuple[str, str]] = []
+        self.done = False
+        self._wakeup = asyncio.Event()
+        self._pending: List[Dict[str, str]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # The background task running the turn, when it runs in this process (used for cancellation)
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, payload: Dict) -> str:
+        """Buffers an event locally and schedules a batched write to the Redis stream."""
+        event_id = f"{self.turn_id}-{len(self.events)}"
+        data = fastjson.dumps(payload)
+        self.events.append((event_id, data))
+        self._pending.append({"id": event_id, "turn": self.turn_id, "data": data})
+        if payload.get("type") in TERMINAL_EVENT_TYPES:
+            self.done = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+        # Wake every waiting subscriber, then re-arm for the next event
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+        return event_id
+
+    async def _flush(self) -> None:
+        # A single flusher per turn keeps XADD ids in order; tokens that arrive meanwhile form the next batch
+        while self._pending:
+            batch, self._pending = self._pending, []
+            ok = await asyncio.to_thread(
+                redis_manager.append_stream_events,
+                self.session_id, batch, STREAM_BUFFER_MAXLEN, STREAM_BUFFER_TTL,
+            )
+            if not ok:
+                print(f"[StreamBuffer] Could not persist {len(batch)} events for session {self.session_id}; local replay only.")
+
+    async def subscribe(self, after_seq: int = -1) -> AsyncGenerator[Tuple[str, str], None]:
+        """Yields buffered events after `after_seq`, then follows the turn live until it finishes."""
+        next_index = after_seq + 1
+        while True:
+            wakeup = self._wakeup
+            while next_index < len(self.events):
+                yield self.events[next_index]
+                next_index += 1
+            if self.done:
+                return
+            await wakeup.wait()
+
+
+class StreamBuffer:
+    """Tracks live turns per session and replays them for clients reconnecting with Last-Event-ID."""
+
+    def __init__(self):
+        self.live_turns: Dict[str, TurnStream] = {}
+        self._last_turn_ms: Dict[str, int] = {}
+
+    def next_turn_ms(self, session_id: str) -> int:
+        # Turn ids must increase per session so they sort correctly inside the Redis stream
+        turn_ms = max(int(time.time() * 1000), self._last_turn_ms.get(session_id, 0) + 1)
+        self._last_turn_ms[session_id] = turn_ms
+        return turn_ms
+
+    def start_turn(self, session_id: str, turn_ms: Optional[int] = None) -> TurnStream:
+        """Creates the live buffer for a new turn; `turn_ms` is given when the id was assigned elsewhere (queue mode)."""
+        turn = TurnStream(session_id, turn_ms or self.next_turn_ms(session_id))
+        self.live_turns[session_id] = turn
+        return turn
+
+    async def drain(self) -> None:
+        """Waits until every live turn's buffered events have been written to Redis (used at shutdown)."""
+        flushes = [turn._flush_task for turn in self.live_turns.values() if turn._flush_task and not turn._flush_task.done()]
+        if flushes:
+            await asyncio.gather(*flushes, return_exceptions=True)
+
+    def finish_turn(self, turn: TurnStream) -> None:
+        """Keeps a finished turn around briefly for local replay, then drops it."""
+        def _evict():
+            if self.live_turns.get(turn.session_id) is turn:
+                del self.live_turns[turn.session_id]
+                self._last_turn_ms.pop(turn.session_id, None)
+        asyncio.get_running_loop().call_later(STREAM_LIVE_GRACE, _evict)
+
+    async def resume(self, session_id: str, last_event_id: str) -> AsyncGenerator[str, None]:
+        """Yields formatted SSE frames following `last_event_id`, from memory or the Redis stream."""
+        parsed = parse_event_id(last_event_id)
+        if parsed is None:
+            yield self._expired_frame(session_id, "Invalid Last-Event-ID.")
+            return
+        _, turn_ms, seq = parsed
+
+        turn = self.live_turns.get(session_id)
+        if turn and turn.turn_id == str(turn_ms):
+            print(f"[StreamBuffer] Resuming session {session_id} from local buffer after {last_event_id}.")
+            async for event_id, data in turn.subscribe(after_seq=seq):
+                yield format_sse(session_id, event_id, data)
+            return
+
+        print(f"[StreamBuffer] Resuming session {session_id} from Redis stream after {last_event_id}.")
+        async for frame in self.follow(session_id, turn_ms, after_seq=seq):
+            yield frame
+
+    async def follow(self, session_id: str, turn_ms: int, after_seq: int = -1) -> AsyncGenerator[str, None]:
+        """Yields SSE frames of a turn from the Redis stream, waiting for it to finish if it is still running.
+
+        Used to resume turns that aren't live in this process, and in queue mode to relay
+        turns executed by a worker process.
+        """
+        async for event_id, data in self.follow_events(session_id, turn_ms, after_seq):
+            yield format_sse(session_id, event_id, data) if event_id else f"data: {data}\n\n"
+
+    async def follow_events(self, session_id: str, turn_ms: int, after_seq: int = -1) -> AsyncGenerator[Tuple[Optional[str], str], None]:
+        """Like `follow`, but yields raw (event_id, data) pairs; synthesized error events have no id."""
+        if after_seq >= 0:
+            cursor = f"{turn_ms}-{after_seq}"
+            entries = await redis_manager.read_stream_events(session_id, cursor)
+            if not entries and not await redis_manager.read_stream_events(session_id, cursor, inclusive=True):
+                # The acknowledged event is gone too: the buffer expired or never existed
+                yield None, self._expired_data(session_id, "The previous response is no longer available. Please resend your message.")
+                return
+        else:
+            # Fresh turn: start just before its first possible id; older turns' entries are skipped below
+            cursor = f"{turn_ms - 1}-0"
+            entries = []
+
+        deadline = time.monotonic() + STREAM_RESUME_TIMEOUT
+        while True:
+            if entries:
+                deadline = time.monotonic() + STREAM_RESUME_TIMEOUT
+            for entry_id, fields in entries:
+                cursor = entry_id
+                if fields.get("turn") != str(turn_ms):
+                    if int(fields.get("turn") or 0) > turn_ms:
+                        # A newer turn started, so this one ended without a terminal event
+                        yield None, self._expired_data(session_id, "The previous response was interrupted. Please resend your message.")
+                        return
+                    continue
+                yield entry_id, fields.get("data", "")
+                if fastjson.loads(fields.get("data") or "{}").get("type") in TERMINAL_EVENT_TYPES:
+                    return
+            if time.monotonic() >= deadline:
+                break
+            # The turn is still running in another process: follow the stream until it finishes
+            entries = await redis_manager.read_stream_events(session_id, cursor, block_ms=1000)
+        yield None, self._expired_data(session_id, "Timed out waiting for the response. Please resend your message.")
+
+    @staticmethod
+    def _expired_data(session_id: str, content: str) -> str:
+        return fastjson.dumps({'type': 'error', 'content': content, 'session_id': session_id})
+
+    @classmethod
+    def _expired_frame(cls, session_id: str, content: str) -> str:
+        return f"data: {cls._expired_data(session_id, content)}\n\n"
+
+
+stream_buffer = StreamBuffer()
@@ -0,0 +1,117 @@
+"""Batch runner ordering, bounded concurrency, cancellation and stream-slot admission:
+
+    uv run --extra test python -m unittest discover tests
+"""
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import batch
+import fastjson
+from concurrency import admission_controller
+
+
+async def _lines(lines, reads=None):
+    for line in lines:
+        if reads is not None:
+            reads.append(line)
+        yield line
+        await asyncio.sleep(0)
+
+
+class RunBatchTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.running = 0
+        self.peak = 0
+        self.cancelled = []
+
+    async def fake_answer(self, index, line, timeout):
+        """Answers after the number of milliseconds in the message."""
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            item = fastjson.loads(line)
+            await asyncio.sleep(int(item["message"]) / 1000)
+            return {"type": "result", "id": item.get("id", index), "status": "ok", "seconds": 0.0, "answer": "x"}
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        finally:
+            self.running -= 1
+
+    def _questions(self, delays):
+        return [fastjson.dumps({"id": f"q{index}", "message": str(delay)}) for index, delay in enumerate(delays)]
+
+    async def test_results_arrive_in_completion_order_then_summary(self):
+        lines = self._questions([60, 10, 30]) + ["", "   "]
+        with mock.patch.object(batch, "answer_item", self.fake_answer):
+            records = [record async for record in batch.run_batch(_lines(lines), concurrency=3, timeout=5)]
+
+        self.assertEqual([record["id"] for record in records[:-1]], ["q1", "q2", "q0"])
+        summary = records[-1]
+        self.assertEqual(summary["type"], "summary")
+        self.assertEqual((summary["items"], summary["ok"], summary["rejected"]), (3, 3, 0))
+
+    async def test_concurrency_and_input_reads_are_bounded(self):
+        reads = []
+        lines = self._questions([20] * 12)
+        with mock.patch.object(batch, "answer_item", self.fake_answer):
+            results = batch.run_batch(_lines(lines, reads), concurrency=3, timeout=5)
+            first = await results.__anext__()
+            # Only as many lines as slots (plus the results not yet consumed) have been read
+            self.assertLessEqual(len(reads), 3 + 3 + 1)
+            rest = [record async for record in results]
+
+        self.assertEqual(first["type"], "result")
+        self.assertEqual(self.peak, 3)
+        self.assertEqual(rest[-1]["items"], 12)
+
+    async def test_concurrency_is_clamped(self):
+        with mock.patch.object(batch, "answer_item", self.fake_answer), \
+                mock.patch.object(batch, "BATCH_MAX_CONCURRENCY", 2):
+            records = [record async for record in batch.run_batch(_lines(self._questions([5] * 5)), concurrency=50)]
+        self.assertEqual(records[-1]["concurrency"], 2)
+        self.assertEqual(self.peak, 2)
+
+    async def test_consumer_going_away_cancels_running_items(self):
+        lines = self._questions([5, 1000, 1000, 1000])
+        with mock.patch.object(batch, "answer_item", self.fake_answer):
+            results = batch.run_batch(_lines(lines), concurrency=4, timeout=5)
+            first = await results.__anext__()
+            await results.aclose()
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(first["id"], "q0")
+        self.assertEqual(sorted(self.cancelled), [1, 2, 3])
+        self.assertEqual(self.running, 0)
+
+
+class BatchAdmissionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._state = (admission_controller.max_inflight, admission_controller.inflight)
+
+    async def asyncTearDown(self):
+        admission_controller.max_inflight, admission_controller.inflight = self._state
+
+    async def test_waits_for_a_slot_outside_the_interactive_reserve(self):
+        admission_controller.max_inflight, admission_controller.inflight = 4, 1
+        with mock.patch.object(batch, "BATCH_RESERVED_STREAMS", 2), \
+                mock.patch.object(batch, "BATCH_ADMISSION_POLL", 0.01):
+            loop = asyncio.get_running_loop()
+            self.assertTrue(await batch._admit(time.monotonic() + 1))  # 2 in flight, 2 reserved
+            self.assertEqual(admission_controller.inflight, 2)
+            self.assertFalse(await batch._admit(time.monotonic() + 0.05))
+
+            loop.call_later(0.03, admission_controller.release)
+            self.assertTrue(await batch._admit(time.monotonic() + 1))
+
+    async def test_always_leaves_interactive_turns_a_slot(self):
+        admission_controller.max_inflight, admission_controller.inflight = 2, 0
+        with mock.patch.object(batch, "BATCH_RESERVED_STREAMS", 8):
+            self.assertTrue(await batch._admit(time.monotonic() + 1))
+            self.assertFalse(await batch._admit(time.monotonic()))
+
+
+if __name__ == "__main__":
+    unittest.main()
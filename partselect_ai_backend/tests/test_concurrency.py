@@ -0,0 +1,174 @@
+"""Per-session turn gate, admission control and the Redis turn lock (fakeredis with Lua):
+
+    uv run --extra test python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import fakeredis
+
+import concurrency
+from concurrency import AdmissionController, SessionTurnGate, TurnRejectedError, admission_rejected
+from redis_manager import redis_manager
+
+
+class SessionTurnGateTest(unittest.IsolatedAsyncioTestCase):
+    def test_reject_policy_allows_one_turn_per_session(self):
+        gate = SessionTurnGate(policy="reject", distributed=False)
+        slot = gate.reserve("s1")
+        with self.assertRaises(TurnRejectedError):
+            gate.reserve("s1")
+        gate.reserve("s2")  # other sessions are unaffected
+
+        slot.release()
+        gate.reserve("s1")
+
+    def test_queue_policy_bounds_waiting_turns(self):
+        gate = SessionTurnGate(policy="queue", max_queued=2, distributed=False)
+        slots = [gate.reserve("s1") for _ in range(3)]  # one running, two queued
+        with self.assertRaises(TurnRejectedError):
+            gate.reserve("s1")
+
+        slots[0].release()
+        slots.append(gate.reserve("s1"))
+
+    async def test_queued_turns_run_in_arrival_order(self):
+        gate = SessionTurnGate(policy="queue", max_queued=5, distributed=False)
+        order, running = [], 0
+
+        async def turn(name, slot):
+            nonlocal running
+            async with slot:
+                running += 1
+                self.assertEqual(running, 1)
+                await asyncio.sleep(0.01)
+                order.append(name)
+                running -= 1
+
+        await asyncio.gather(*(turn(name, gate.reserve("s1")) for name in "abcd"))
+
+        self.assertEqual(order, list("abcd"))
+        self.assertEqual(gate._refs, {})
+        self.assertEqual(gate._locks, {})
+
+    async def test_cancelled_turns_release_their_reservations(self):
+        gate = SessionTurnGate(policy="queue", max_queued=1, distributed=False)
+        started = asyncio.Event()
+
+        async def running_turn(slot):
+            async with slot:
+                started.set()
+                await asyncio.sleep(10)
+
+        async def waiting_turn(slot):
+            async with slot:
+                self.fail("a cancelled waiter must not run")
+
+        running = asyncio.create_task(running_turn(gate.reserve("s1")))
+        await started.wait()
+        waiting = asyncio.create_task(waiting_turn(gate.reserve("s1")))
+        await asyncio.sleep(0)
+        with self.assertRaises(TurnRejectedError):
+            gate.reserve("s1")
+
+        waiting.cancel()
+        running.cancel()
+        await asyncio.gather(running, waiting, return_exceptions=True)
+
+        self.assertEqual(gate._refs, {})
+        async with gate.reserve("s1"):
+            pass
+
+    def test_release_is_idempotent(self):
+        gate = SessionTurnGate(policy="queue", max_queued=1, distributed=False)
+        first, second = gate.reserve("s1"), gate.reserve("s1")
+        first.release()
+        first.release()
+        self.assertEqual(gate._refs["s1"], 1)
+        second.release()
+        self.assertEqual(gate._refs, {})
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def test_try_admit_keeps_reserved_slots_free(self):
+        controller = AdmissionController(max_inflight=4)
+        rejected = admission_rejected.value()
+
+        self.assertTrue(controller.try_admit(reserve=2))
+        self.assertTrue(controller.try_admit(reserve=2))
+        self.assertFalse(controller.try_admit(reserve=2))
+        # Interactive turns can still use the reserved slots
+        controller.admit()
+        controller.admit()
+        self.assertEqual(controller.inflight, 4)
+        self.assertEqual(admission_rejected.value(), rejected)
+
+        with self.assertRaises(TurnRejectedError):
+            controller.admit()
+        self.assertEqual(admission_rejected.value(), rejected + 1)
+        self.assertFalse(controller.try_admit())
+        self.assertEqual(admission_rejected.value(), rejected + 1)
+
+    def test_release_never_goes_negative(self):
+        controller = AdmissionController(max_inflight=1)
+        controller.release()
+        self.assertEqual(controller.inflight, 0)
+        self.assertTrue(controller.try_admit())
+
+
+class DistributedTurnLockTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._redis = redis_manager.redis
+        redis_manager.redis = fakeredis.FakeRedis(decode_responses=True)
+        # Short TTL so renewals happen within the test; short wait so contention is rejected quickly
+        self._patches = [mock.patch.object(concurrency, "SESSION_LOCK_TTL_MS", 150),
+                         mock.patch.object(concurrency, "SESSION_LOCK_WAIT", 0.2)]
+        for patch in self._patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self._patches:
+            patch.stop()
+        redis_manager.redis = self._redis
+
+    async def test_lock_is_renewed_past_its_ttl_and_released_on_exit(self):
+        gate, other_process = SessionTurnGate(distributed=True), SessionTurnGate(distributed=True)
+
+        async with gate.reserve("s1") as slot:
+            token = redis_manager.redis.get("lock:turn:s1")
+            self.assertEqual(token, slot._lock_token)
+            await asyncio.sleep(0.6)  # four TTLs
+            self.assertEqual(redis_manager.redis.get("lock:turn:s1"), token)
+            with self.assertRaises(TurnRejectedError):
+                async with other_process.reserve("s1"):
+                    pass
+
+        self.assertIsNone(redis_manager.redis.get("lock:turn:s1"))
+        self.assertTrue(slot._renewer.cancelled() or slot._renewer.done())
+        async with other_process.reserve("s1"):
+            self.assertIsNotNone(redis_manager.redis.get("lock:turn:s1"))
+
+    async def test_renewal_stops_when_another_process_took_the_lock(self):
+        gate = SessionTurnGate(distributed=True)
+
+        async with gate.reserve("s1") as slot:
+            redis_manager.redis.set("lock:turn:s1", "someone-else")
+            await asyncio.sleep(0.2)
+            self.assertTrue(slot._renewer.done())
+            self.assertEqual(redis_manager.redis.get("lock:turn:s1"), "someone-else")
+
+        # Exiting must not delete a lock we no longer own
+        self.assertEqual(redis_manager.redis.get("lock:turn:s1"), "someone-else")
+
+    async def test_falls_back_to_the_local_lock_without_redis(self):
+        redis_manager.redis = None
+        gate = SessionTurnGate(distributed=True)
+
+        async with gate.reserve("s1") as slot:
+            self.assertIsNone(slot._lock_token)
+        self.assertEqual(gate._refs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
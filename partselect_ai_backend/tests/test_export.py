@@ -0,0 +1,105 @@
+"""Export paging and resume cursors, against an in-memory fakeredis server:
+
+    uv run --extra test python -m unittest discover tests
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import fakeredis
+
+import fastjson
+from export import iter_export, parse_cursor
+from redis_manager import redis_manager
+
+# Recent enough to survive the order index's TTL trim
+CREATED = (datetime.now() - timedelta(hours=2)).isoformat()
+LATER = (datetime.now() - timedelta(hours=1)).isoformat()
+
+
+def _records(lines, kind="order"):
+    return [record["id"] for record in map(fastjson.loads, lines) if record["type"] == kind]
+
+
+def _cursors(lines):
+    return [record["cursor"] for record in map(fastjson.loads, lines) if record["type"] == "cursor"]
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self._redis = redis_manager.redis
+        redis_manager.redis = fakeredis.FakeRedis(decode_responses=True)
+
+    def tearDown(self):
+        redis_manager.redis = self._redis
+
+    def _order(self, session_id, created_at=CREATED):
+        redis_manager.create_order(session_id, {"items": {}, "created_at": created_at})
+
+    def _export(self, **kwargs):
+        kwargs.setdefault("max_keys_per_second", 0)
+        return list(iter_export(**kwargs))
+
+    def test_orders_sharing_a_timestamp_span_pages(self):
+        for session_id in ("a", "b", "c", "d", "e"):
+            self._order(session_id)
+
+        lines = self._export(types=("order",), since=0, batch_size=2)
+
+        self.assertEqual(_records(lines), ["a", "b", "c", "d", "e"])
+        self.assertEqual(fastjson.loads(lines[-1]), {"type": "end", "records": 5})
+
+    def test_resume_inside_a_run_of_equal_timestamps(self):
+        for session_id in ("a", "b", "c"):
+            self._order(session_id)
+        self._order("z", LATER)
+        first = self._export(types=("order",), since=0, batch_size=2)
+        cursor = _cursors(first)[0]
+        self.assertTrue(cursor.startswith("order@") and cursor.endswith(",2"), cursor)
+
+        rest = self._export(types=("order",), resume=cursor, batch_size=2)
+
+        self.assertEqual(_records(rest), ["c", "z"])
+
+    def test_interrupted_export_resumes_from_its_error_cursor(self):
+        for session_id in ("a", "b", "c", "d"):
+            self._order(session_id)
+        real = redis_manager.orders_created_between
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(args)
+            return None if len(calls) == 2 else real(*args, **kwargs)
+
+        with mock.patch.object(redis_manager, "orders_created_between", flaky):
+            first = self._export(types=("order",), since=0, batch_size=2)
+        error = fastjson.loads(first[-1])
+        self.assertEqual(error["type"], "error")
+
+        rest = self._export(types=("order",), resume=error["cursor"], batch_size=2)
+
+        self.assertEqual(_records(first) + _records(rest), ["a", "b", "c", "d"])
+
+    def test_scan_cursor_resumes_with_the_next_types(self):
+        redis_manager.redis.hset("session:s1", mapping={"created_at": CREATED})
+        redis_manager.redis.hset("cart:s1", mapping={"PS1": '{"quantity": 1}'})
+        self._order("s1")
+
+        lines = self._export(types=("session", "cart", "order"), resume="cart:0")
+
+        self.assertEqual(_records(lines, "session"), [])
+        self.assertEqual(_records(lines, "cart"), ["s1"])
+        self.assertEqual(_records(lines, "order"), ["s1"])
+        self.assertEqual(fastjson.loads(lines[-1])["records"], 2)
+
+    def test_parse_cursor(self):
+        self.assertEqual(parse_cursor("cart:17"), ("cart", "17", False))
+        self.assertEqual(parse_cursor("order@1759320000.0,3"), ("order", "1759320000.0,3", True))
+        self.assertEqual(parse_cursor("order@1759320000.0"), ("order", "1759320000.0", True))
+        for bad in ("cart@1.0", "order@x", "order@1.0,x", "cart:x", "basket:0"):
+            with self.assertRaises(ValueError, msg=bad):
+                parse_cursor(bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+"""Prometheus text rendering of the in-process metrics registry:
+
+    uv run --extra test python -m unittest discover tests
+"""
+import unittest
+
+from metrics import MetricsRegistry
+
+
+class MetricsRenderTest(unittest.TestCase):
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("llm_http_requests_total", "LLM HTTP attempts by outcome.")
+        counter.inc(labels={"outcome": 'Error: "bad"\nC:\\path'})
+
+        sample = registry.render().splitlines()[-1]
+
+        self.assertEqual(sample, 'llm_http_requests_total{outcome="Error: \\"bad\\"\\nC:\\\\path"} 1.0')
+
+    def test_histogram_bucket_labels_follow_escaped_labels(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("turn_seconds", "Turn latency.", buckets=(1.0,))
+        histogram.observe(0.5, labels={"tier": 'a"b'})
+
+        rendered = registry.render()
+
+        self.assertIn('turn_seconds_bucket{tier="a\\"b",le="1.0"} 1', rendered)
+        self.assertIn('turn_seconds_count{tier="a\\"b"} 1', rendered)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Resuming /stream_chat with Last-Event-ID.
+
+Runs against the in-process turn buffer with Redis disabled, so no server is needed:
+
+    uv run --extra test python -m unittest discover tests
+"""
+import unittest
+from uuid import uuid4
+
+import httpx
+from fastapi import FastAPI
+
+from redis_manager import redis_manager
+from routes.chat import chat_router
+from stream_buffer import format_sse, parse_event_id, stream_buffer
+
+
+def _sse_id(frame: str) -> str:
+    return next(line[len("id: "):] for line in frame.splitlines() if line.startswith("id: "))
+
+
+class StreamResumeTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # Local replay only: every Redis call answers with its failure default
+        self._redis = redis_manager.redis
+        redis_manager.redis = None
+        self.app = FastAPI()
+        self.app.include_router(chat_router)
+
+    async def asyncTearDown(self):
+        redis_manager.redis = self._redis
+        stream_buffer.live_turns.clear()
+
+    async def _get(self, params, headers=None) -> str:
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/stream_chat", params=params, headers=headers or {})
+        self.assertEqual(response.status_code, 200)
+        return response.text
+
+    async def test_reconnect_without_session_id_resumes_first_turn(self):
+        # A new conversation's first turn: the client only learns the session from the stream
+        session_id = str(uuid4())
+        turn = stream_buffer.start_turn(session_id)
+        first = turn.publish({"type": "token", "content": "Hello", "session_id": session_id})
+        turn.publish({"type": "token", "content": " there", "session_id": session_id})
+        turn.publish({"type": "done", "session_id": session_id})
+
+        # EventSource reconnects to the original URL, which has no session_id
+        last_event_id = _sse_id(format_sse(session_id, first, "{}"))
+        body = await self._get({"message": "hi"}, {"Last-Event-ID": last_event_id})
+
+        self.assertNotIn("no longer available", body)
+        self.assertNotIn("Hello", body)
+        self.assertIn(" there", body)
+        self.assertIn('"type":"done"', body)
+        self.assertIn(f"id: {session_id}.{turn.turn_id}-2", body)
+
+    async def test_query_session_id_still_resumes(self):
+        session_id = str(uuid4())
+        turn = stream_buffer.start_turn(session_id)
+        first = turn.publish({"type": "token", "content": "Hello", "session_id": session_id})
+        turn.publish({"type": "done", "session_id": session_id})
+
+        body = await self._get({"message": "hi", "session_id": session_id, "last_event_id": first})
+
+        self.assertIn('"type":"done"', body)
+        self.assertNotIn("no longer available", body)
+
+    def test_parse_event_id(self):
+        session_id = str(uuid4())
+        self.assertEqual(parse_event_id(f"{session_id}.1700000000000-3"), (session_id, 1700000000000, 3))
+        self.assertEqual(parse_event_id("1700000000000-3"), (None, 1700000000000, 3))
+        self.assertIsNone(parse_event_id(f"{session_id}.garbage"))
+        self.assertIsNone(parse_event_id(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
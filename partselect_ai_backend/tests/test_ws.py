@@ -0,0 +1,78 @@
+"""WebSocket frame validation, with the agent runner stubbed out and carts in fakeredis:
+
+    uv run --extra test python -m unittest discover tests
+"""
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from redis_manager import redis_manager
+from routes import ws
+
+MALFORMED = ["e", None, "Malformed frame."]
+
+
+async def _record_new_session(session_id):
+    pass
+
+
+class ChatSocketTest(unittest.TestCase):
+    def setUp(self):
+        self._redis = redis_manager.redis
+        redis_manager.redis = fakeredis.FakeRedis(decode_responses=True)
+        runner = SimpleNamespace(get_or_create_session_agent=lambda session_id: ({}, True),
+                                 record_new_session=_record_new_session)
+        self._patches = [mock.patch.object(ws, "_runner", lambda: runner),
+                         mock.patch.object(ws, "queue_mode_enabled", lambda: False)]
+        for patch in self._patches:
+            patch.start()
+        app = FastAPI()
+        app.include_router(ws.ws_router)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        for patch in self._patches:
+            patch.stop()
+        redis_manager.redis = self._redis
+
+    def _exchange(self, frames):
+        """Sends each frame (str as text, bytes as binary) and returns the reply to each."""
+        replies = []
+        with self.client.websocket_connect("/ws/chat") as socket:
+            self.assertEqual(json.loads(socket.receive_text())[0], "s")
+            for frame in frames:
+                if isinstance(frame, bytes):
+                    socket.send_bytes(frame)
+                else:
+                    socket.send_text(frame)
+                replies.append(json.loads(socket.receive_text()))
+        return replies
+
+    def test_malformed_frames_get_an_error_and_keep_the_connection(self):
+        frames = ["not json", '{"op": "k"}', '"k"', "[]", '["k"]', '["k", true]', '["k", [1]]', '["k", null]', b"\x00\x01"]
+
+        replies = self._exchange(frames + ['["k", 7]'])
+
+        self.assertEqual(replies[:-1], [MALFORMED] * len(frames))
+        self.assertEqual(replies[-1], ["k", 7, {}])
+
+    def test_unknown_ops_and_bad_arguments_echo_the_ref(self):
+        replies = self._exchange(['["q", "r1"]', '["m", "r2"]', '["m", "r3", 5]', '["a", "r4", "PS1", 0, "Valve"]'])
+
+        self.assertEqual([reply[:2] for reply in replies], [["e", "r1"], ["e", "r2"], ["e", "r3"], ["e", "r4"]])
+
+    def test_cart_frames(self):
+        replies = self._exchange(['["a", 1, "PS1", 2, "Valve"]', '["k", "two"]', '["z", 3]'])
+
+        self.assertEqual(replies[0], ["k", 1, {"PS1": {"quantity": 2, "name": "Valve"}}])
+        self.assertEqual(replies[1], ["k", "two", {"PS1": {"quantity": 2, "name": "Valve"}}])
+        self.assertEqual(replies[2], ["k", 3, {}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Chat turn worker for queue execution mode.
+
+Consumes turn jobs from the sharded Redis Streams written by /stream_chat, runs them
+through the agent graph and publishes tokens into the session's SSE stream, where the
+API pod holding the client connection relays them.
+
+Run one worker per shard set, e.g.:
+    uv run python worker.py --shards 0,1
+    uv run python worker.py --shards 2,3
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.runner import run_turn
+from chat_queue import CHAT_QUEUE_GROUP, CHAT_QUEUE_SHARDS, shard_key
+from concurrency import SessionTurnGate
+import fastjson
+from redis_manager import redis_manager
+from session_activity import session_activity
+from stream_buffer import STREAM_BUFFER_MAXLEN, STREAM_BUFFER_TTL, stream_buffer
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+WORKER_BLOCK_MS = int(os.getenv("WORKER_BLOCK_MS", "1000"))
+
+
+class ChatWorker:
+    def __init__(self, shards: List[int], concurrency: int = WORKER_CONCURRENCY):
+        self.shards = shards
+        self.stream_keys = [shard_key(shard) for shard in shards]
+        self.slots = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        # Turns of one session run in delivery order while other sessions run in parallel
+        self.session_turns = SessionTurnGate(policy="queue", max_queued=concurrency)
+        self.tasks: set = set()
+        self.stopping = False
+
+    @property
+    def consumer_name(self) -> str:
+        # One name for all of this worker's shards, so a single XREADGROUP covers them; stable
+        # across restarts of the same shard set (recovery claims jobs under any name anyway)
+        return "worker:" + ",".join(str(shard) for shard in self.shards)
+
+    async def run(self) -> None:
+        for key in self.stream_keys:
+            if not redis_manager.ensure_consumer_group(key, CHAT_QUEUE_GROUP):
+                raise RuntimeError(f"Could not create consumer group on {key}; is Redis reachable?")
+        print(f"[Worker {socket.gethostname()}:{os.getpid()}] Consuming {self.stream_keys} with concurrency {self.concurrency}.")
+
+        await self._recover_pending()
+        while not self.stopping:
+            await self.slots.acquire()
+            free = 1
+            while free < self.concurrency and not self.slots.locked():
+                await self.slots.acquire()
+                free += 1
+            try:
+                jobs = await self._read_jobs(count=free)
+            except Exception:
+                for _ in range(free):
+                    self.slots.release()
+                raise
+            for _ in range(free - len(jobs)):
+                self.slots.release()
+            for index, (stream_key, job_id, fields) in enumerate(jobs):
+                if index >= free:
+                    # COUNT applies per stream, so one read can return more jobs than free slots
+                    await self.slots.acquire()
+                self._spawn(stream_key, job_id, fields)
+
+        if self.tasks:
+            print(f"[Worker] Draining {len(self.tasks)} in-flight turns...")
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _read_jobs(self, count: int) -> List[tuple]:
+        """New jobs from all of this worker's shards in one blocking XREADGROUP; a job on any shard wakes it."""
+        result = await asyncio.to_thread(
+            redis_manager.read_chat_jobs,
+            {key: ">" for key in self.stream_keys}, CHAT_QUEUE_GROUP, self.consumer_name, count, WORKER_BLOCK_MS,
+        )
+        return [(stream_key, job_id, fields) for stream_key, entries in result for job_id, fields in entries]
+
+    async def _recover_pending(self) -> None:
+        """Fails jobs that were in flight when the previous worker for these shards stopped.
+
+        Their clients already received partial output, so re-running them would duplicate text.
+        Each shard has exactly one worker, so every job pending on our shards was ours, under
+        this consumer name or an earlier one.
+        """
+        pending = []
+        for key in self.stream_keys:
+            claimed = await asyncio.to_thread(redis_manager.claim_chat_jobs, key, CHAT_QUEUE_GROUP, self.consumer_name, 10_000)
+            pending.extend((key, job_id, fields) for job_id, fields in claimed)
+        for stream_key, job_id, fields in pending:
+            if not fields:
+                # Entry was already deleted; just clear it from the pending list
+                redis_manager.ack_chat_job(stream_key, CHAT_QUEUE_GROUP, job_id)
+                continue
+            session_id, turn_id = fields.get("session_id", ""), fields.get("turn", "")
+            print(f"[Worker] Abandoning interrupted job {job_id} for session {session_id}.")
+            data = fastjson.dumps({
+                "type": "error",
+                "content": "The assistant was restarted while answering. Please resend your message.",
+                "session_id": session_id,
+            })
+            redis_manager.append_stream_events(
+                session_id, [{"id": "*", "turn": turn_id, "data": data}], STREAM_BUFFER_MAXLEN, STREAM_BUFFER_TTL
+            )
+            redis_manager.ack_chat_job(stream_key, CHAT_QUEUE_GROUP, job_id)
+
+    def _spawn(self, stream_key: str, job_id: str, fields: Dict[str, str]) -> None:
+        task = asyncio.create_task(self._process(stream_key, job_id, fields))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _process(self, stream_key: str, job_id: str, fields: Dict[str, str]) -> None:
+        session_id = fields.get("session_id", "")
+        try:
+            # Reserve synchronously so the slot order matches delivery order
+            slot = self.session_turns.reserve(session_id)
+            turn = stream_buffer.start_turn(session_id, turn_ms=int(fields["turn"]))
+            await run_turn(session_id, fields.get("message", ""), turn, slot=slot)
+        except Exception as e:
+            print(f"[Worker] Job {job_id} for session {session_id} failed: {type(e).__name__} - {e}")
+        finally:
+            await asyncio.to_thread(redis_manager.ack_chat_job, stream_key, CHAT_QUEUE_GROUP, job_id)
+            self.slots.release()
+
+    def stop(self) -> None:
+        print("[Worker] Stop requested; finishing in-flight turns.")
+        self.stopping = True
+
+
+def parse_shards(value: str) -> List[int]:
+    if not value or value == "all":
+        return list(range(CHAT_QUEUE_SHARDS))
+    shards = [int(part) for part in value.split(",") if part.strip()]
+    for shard in shards:
+        if not 0 <= shard < CHAT_QUEUE_SHARDS:
+            raise argparse.ArgumentTypeError(f"Shard {shard} outside 0..{CHAT_QUEUE_SHARDS - 1}")
+    return shards
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="PartSelect chat turn worker")
+    parser.add_argument("--shards", default=os.getenv("WORKER_SHARDS", "all"),
+                        help="Comma-separated shard numbers to consume (default: all). Each shard must have exactly one worker.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    worker = ChatWorker(parse_shards(args.shards), concurrency=args.concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+    await session_activity.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,6 +2,9 @@ import { EventSourcePolyfill } from 'event-source-polyfill';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// The backend buffers each turn, so a dropped stream can resume via Last-Event-ID
+const MAX_RECONNECT_ATTEMPTS = 3;
+
 const getSessionId = () => localStorage.getItem('session_id');
 
 const setSessionId = (sessionId) => {
@@ -15,6 +18,7 @@ const setSessionId = (sessionId) => {
 export const getAIMessageStream = (userQuery, onToken, onFinish, onError) => {
   const currentSessionId = getSessionId();
   let eventSource = null;
+  let reconnectAttempts = 0;
 
   let url = `${API_BASE_URL}/stream_chat?message=${encodeURIComponent(userQuery)}`;
   if (currentSessionId) {
@@ -36,6 +40,7 @@ export const getAIMessageStream = (userQuery, onToken, onFinish, onError) => {
     };
 
     eventSource.onmessage = (event) => {
+      reconnectAttempts = 0;
       try {
         const data = JSON.parse(event.data);
 
@@ -74,6 +79,13 @@ export const getAIMessageStream = (userQuery, onToken, onFinish, onError) => {
     };
 
     eventSource.onerror = (err) => {
+      if (eventSource.readyState !== EventSource.CLOSED && reconnectAttempts < MAX_RECONNECT_ATTEMPTS) {
+        // Let the polyfill reconnect; it sends Last-Event-ID, which names the session, so the answer
+        // resumes where it stopped even on a first turn whose URL had no session_id
+        reconnectAttempts += 1;
+        console.warn(`[API] SSE connection interrupted, reconnecting (attempt ${reconnectAttempts}).`);
+        return;
+      }
       console.error('[API] EventSource network error or connection failed:', err);
       if (eventSource.readyState === EventSource.CLOSED) {
           console.log("[API] SSE Connection was closed.");